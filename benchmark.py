@@ -0,0 +1,161 @@
+# Headless frame-time benchmark. Plays a scripted walk through a few
+# representative scenes without opening a window and reports where the
+# frame time goes. Exits with status 1 when a scene misses the budget.
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from game import App
+from util.headless import HeadlessPyxel
+from util.profiler import SECTIONS, Profiler
+from util.clock import frame_clock
+from util.replay import InputReplay, load_session
+
+# Boulders, walls and a boulder, walls and ten monsters, four doors, swamp
+SCENES = ["a1", "a2", "a3", "c4", "e3"]
+# Keys held and for how many frames, played in a loop
+SCRIPT = [(["KEY_RIGHT"], 40),
+          (["KEY_DOWN"], 30),
+          (["KEY_F"], 1),
+          (["KEY_LEFT", "KEY_LEFT_SHIFT"], 40),
+          (["KEY_UP"], 30),
+          (["KEY_F"], 1),
+          ([], 10)]
+
+
+def scripted_keys(frames):
+    played = 0
+    while True:
+        for keys, length in SCRIPT:
+            for i in range(0, length):
+                if played == frames:
+                    return
+                played += 1
+                yield keys
+
+
+def percentile(values, share):
+    return float(np.percentile(values, share)) if values else 0.0
+
+
+def run_scene(scene_name, frames, seed, session=None, export=None):
+    pyxel = HeadlessPyxel()
+    if export:
+        # One file per scene: frames.csv becomes frames-a1.csv and so on
+        root, ext = os.path.splitext(export)
+        export = "{}-{}{}".format(root, scene_name, ext)
+    profiler = Profiler(export=export)
+    # One tick per frame, so every run plays the same game
+    clock = frame_clock(pyxel)
+    if session is None:
+        App(pyxel, scene_name, profiler, clock, seed=seed)
+        script = scripted_keys(frames)
+    else:
+        # A recorded session brings its own keys and ticks per frame
+        App(pyxel, scene_name, profiler, clock, seed=seed,
+            controls=InputReplay(session))
+        script = [[] for frame in range(0, frames)]
+    frame_times = []
+    blocks = []
+    for keys in script:
+        held = [getattr(pyxel, key) for key in keys]
+        before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        pyxel.step(held)
+        frame_times.append(time.perf_counter() - start)
+        blocks.append(sys.getallocatedblocks() - before)
+    profiler.close()
+    phases = dict()
+    for phase in SECTIONS:
+        phases[phase] = sum(
+            frame.get(phase, 0.0) for frame in profiler.frames) / frames
+    return {"scene": scene_name,
+            "frames": frames,
+            "mean_ms": 1000 * sum(frame_times) / frames,
+            "p99_ms": 1000 * percentile(frame_times, 99),
+            "phases_us": {k: 1e6 * v for k, v in phases.items()},
+            "blocks_per_frame": sum(blocks) / frames,
+            "calls_per_frame": {k: v / frames
+                                for k, v in pyxel.calls.items()},
+            "clock": clock.counters()}
+
+
+def drawing_calls(result):
+    return sum(count for call, count in result["calls_per_frame"].items()
+               if call != "blt_pixels")
+
+
+def report(result):
+    print("{scene:>6}  mean {mean_ms:6.3f} ms  p99 {p99_ms:6.3f} ms  "
+          "blocks/frame {blocks_per_frame:6.1f}  "
+          "pixels/frame {:6.0f}".format(
+              result["calls_per_frame"].get("blt_pixels", 0), **result))
+    print("        " + "  ".join(
+        "{} {:.0f}us".format(k, v) for k, v in result["phases_us"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play a scripted walk through a few scenes with no "
+                    "window and report where the frame time goes")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--scenes", default=",".join(SCENES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if a scene's mean frame time is above this")
+    parser.add_argument("--budget-calls", type=float, default=None,
+                        help="fail if a scene makes more drawing calls per "
+                             "frame than this")
+    parser.add_argument("--budget-pixels", type=float, default=None,
+                        help="fail if a scene blits more pixels per frame "
+                             "than this")
+    parser.add_argument("--json", default=None,
+                        help="also write the results to this file")
+    parser.add_argument("--replay", default=None,
+                        help="profile a session saved with game.py --record "
+                             "instead of the scripted walk")
+    parser.add_argument("--export", default=None,
+                        help="write every frame's section times and call "
+                             "counts to this .csv or .jsonl file")
+    args = parser.parse_args()
+
+    results = []
+    if args.replay:
+        session = load_session(args.replay)
+        runs = [(session["scene_name"], len(session["frames"]),
+                 session["seed"], session)]
+    else:
+        runs = [(scene_name, args.frames, args.seed, None)
+                for scene_name in args.scenes.split(",")]
+    for run in runs:
+        result = run_scene(*run, export=args.export)
+        report(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    # Time depends on the machine; calls and pixels, from a run that plays
+    # the same every time, do not, so only they make a safe release gate
+    failed = False
+    for budget, unit, measure in (
+            (args.budget_ms, "ms", lambda r: r["mean_ms"]),
+            (args.budget_calls, "drawing calls", drawing_calls),
+            (args.budget_pixels, "pixels", lambda r: r["calls_per_frame"].get(
+                "blt_pixels", 0))):
+        if budget is None:
+            continue
+        over = [r["scene"] for r in results if measure(r) > budget]
+        if over:
+            print("Over the {} {} budget: {}".format(budget, unit,
+                                                     ", ".join(over)))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,212 +1,233 @@
-import pyxel
+import argparse
 import sys
-import random
-from util.collision import collision_detect, detect_door
-from util.collision import get_character_bubble, get_character_pixels
-from util.collision import get_tile_bubble, get_fireball_bubble
 import util.draw as draw
 import util.load_scene as scene
-from util.load_world import all_boulders, all_monsters
-from util.movable import detect_movable_boulder, closest_point
+from util.load_world import load_world
+from util.movement import DIRECTIONS, PLAYER_SPEED, move_player
+from util.world_pack import open_pack
+from util.atlas import load_atlas, sprite_registry
+from util.draw_queue import BOULDERS, FIREBALL, HUD, MONSTERS, PLAYER, TEXTS
+from util.draw_queue import DrawQueue
+from util.grid import SceneGrid
+from util.background import compose_background, to_rows, upload
+from util.monsters import MonsterGroup
+from util.pathfinding import FlowField
+from util.projectiles import Projectiles
+from util.spatial import SpatialHash
+from util.profiler import WINDOW, NullProfiler, Profiler
+from util.prefetch import Prefetcher, neighbours
+from util.clock import SimulationClock
+from util.save import AUTOSAVE_TICKS, Journal, NullJournal
+from util.rng import EngineRandom, new_seed
+from util.replay import InputRecorder, InputReplay, LiveInput, load_session
 
 
 class App:
-    def __init__(self):
+    def __init__(self, pyxel=None, scene_name="a1", profiler=None,
+                 clock=None, journal=None, seed=None, controls=None):
+        # Any object with the pyxel module's API will do, such as the
+        # headless backend in util.headless used by benchmark.py.
+        if pyxel is None:
+            import pyxel
+        self.profiler = profiler or NullProfiler()
+        # Counts the drawing calls when profiling, else pyxel itself
+        self.pyxel = self.profiler.wrap(pyxel)
+        self.clock = clock or SimulationClock()
+        self.journal = journal or NullJournal()
+        self.random = EngineRandom(seed)
+        self.controls = controls or LiveInput(pyxel)
         pyxel.init(160, 120, caption="Dungeon DOS")
         pyxel.load("assets/image_map.pyxres")
-        self.all_boulders = all_boulders()
-        self.scene_name = "a1"
+        self.world = open_pack()
+        self.atlas = load_atlas()
+        self.sprites = sprite_registry(self.atlas)
+        self.draw_queue = DrawQueue(draw.background)
+        self.state = load_world(self.world)
+        self.prefetcher = Prefetcher(self.atlas, self.world)
+        self.scene_name = scene_name
         self.scene_setup = False
         self.from_door = False
-        self.initialize_scene()
+        self.monster_group = None
         self.inventory_up = False
         self.main_play = True
         self.fireballs = 10
-        self.fireball_in_flight = False
-        self.fireball_coords = {
-            "x": 0, "y": 0, "range": 0, "direction": None, "animate": 0}
+        self.projectiles = Projectiles()
         self.coins = 5
         self.health = 10
-        self.monsters = all_monsters()
+        self.speed = PLAYER_SPEED
+        self.moves = []
+        self.pulling = False
         self.death = False
+        self.ticks = 0
+        saved = self.journal.player()
+        if saved is not None:
+            self.resume(saved)
+        self.initialize_scene()
         pyxel.run(self.update, self.draw_scene)
 
+    def resume(self, saved):
+        # Carry on from the last checkpoint, where the player stood then
+        self.scene_name = saved["scene_name"]
+        self.position = {"x": saved["x"], "y": saved["y"]}
+        self.from_door = True
+        self.health = saved["health"]
+        self.fireballs = saved["fireballs"]
+        self.coins = saved["coins"]
+
+    def checkpoint(self):
+        self.monster_group.store()
+        self.journal.checkpoint(self.state, {
+            "scene_name": self.scene_name,
+            "x": self.position["x"], "y": self.position["y"],
+            "health": self.health, "fireballs": self.fireballs,
+            "coins": self.coins})
+
     def log_handler(self, text):
         sys.stdout.write("\r {}".format(str(text)))
         sys.stdout.flush()
 
     def initialize_scene(self):
+        pyxel = self.pyxel
+        if self.monster_group is not None:
+            # Keep the monsters of the room being left where they were,
+            # and save the rooms changed since the last checkpoint
+            self.checkpoint()
+        prepared = self.prefetcher.take(self.scene_name)
+        if prepared is not None:
+            room, background = prepared
+        else:
+            room = scene.validate(scene.load_scene(self.scene_name,
+                                                   self.world))
+            background = None
         if not self.from_door:
-            self.position = scene.position(self.scene_name)
-        self.direction = scene.direction(self.scene_name)
-        self.mv_boulders = scene.mv_boulders(self.scene_name)
-        self.scene_texts = scene.scene_texts(self.scene_name)
-        self.ground = scene.ground(self.scene_name)
-        self.doors = scene.doors(self.scene_name)
-        self.walls = scene.walls(self.scene_name)
+            # The player moves by editing this dict, so keep the cached
+            # scene record untouched.
+            self.position = dict(room.position)
+        self.direction = room.direction
+        self.scene_texts = room.texts
+        self.ground = room.ground
+        self.doors = room.doors
+        self.walls = room.walls
+        self.door_index = SpatialHash()
+        for i, door in enumerate(self.doors):
+            self.door_index.insert(i, door["x"], door["y"])
+        # Rooms further than a door away may be evicted from memory
+        self.state.pin([self.scene_name] + sorted(neighbours(room)))
+        self.room = self.state.room(self.scene_name)
+        self.journal.restore(self.room)
+        self.grid = SceneGrid(self.atlas, self.walls, self.doors, self.room)
+        self.monster_group = MonsterGroup(self.room, self.grid.border,
+                                          FlowField(self.walls, self.doors))
+        self.projectiles = Projectiles(self.walls, self.doors)
+        # The static layer only changes when the scene does
+        if background is None:
+            background = to_rows(compose_background(
+                self.atlas, self.ground, self.walls, self.doors,
+                room.ground_map))
+        upload(pyxel, background)
+        self.draw_queue.invalidate()
+        self.prefetcher.enter(room)
         self.from_door = False
         self.scene_setup = True
 
     def update(self):
+        if self.controls.finished:
+            # The end of a replayed session
+            self.profiler.close()
+            self.prefetcher.close()
+            self.pyxel.quit()
+            return None
+        with self.profiler.section("input"):
+            self.handle_input()
+        # The world moves at a fixed rate however fast frames come in
+        for tick in range(0, self.controls.frame(self.clock.advance())):
+            self.simulate()
+
+    def simulate(self):
+        if not self.main_play or self.death:
+            return
+        self.move()
+        if not self.scene_setup:
+            with self.profiler.section("scene"):
+                self.initialize_scene()
+
+        # move monsters
+        with self.profiler.section("monsters"):
+            self.health -= self.monster_group.step(self.position,
+                                                   self.random)
+        if self.health < 0:
+            self.death = True
+
+        self.ticks += 1
+        if self.ticks % AUTOSAVE_TICKS == 0 and not self.death:
+            self.checkpoint()
+
+        if self.projectiles.flying:
+            with self.profiler.section("fireball"):
+                self.projectiles.step(self.room, self.monster_group)
+
+    def handle_input(self):
         # These controls do not work outside of this main App class.
-        if self.scene_name == "a1":
-            boulder_key = "a1_duplicate"
-        else:
-            boulder_key = self.scene_name
-        if pyxel.btnp(pyxel.KEY_Q):
+        pyxel = self.pyxel
+        controls = self.controls
+        if controls.btnp("KEY_Q"):
+            if not self.death:
+                self.checkpoint()
+            self.journal.close()
+            controls.close()
+            self.profiler.close()
+            self.prefetcher.close()
             pyxel.quit()
-        if pyxel.btnp(pyxel.KEY_R):
+        if controls.btnp("KEY_R"):
             self.fireballs = 10
-        if pyxel.btnp(pyxel.KEY_F):
-            if self.main_play and not self.fireball_in_flight:
-                if self.fireballs >= 1:
+        if controls.btnp("KEY_F"):
+            if self.main_play and self.fireballs >= 1:
+                fire_coords = draw.start_fireball(self.position,
+                                                  self.direction)
+                if self.projectiles.fire(fire_coords[0], fire_coords[1],
+                                         self.direction):
                     self.fireballs -= 1
-                    fire_coords = draw.start_fireball(
-                                    pyxel, self.position, self.direction)
-                    self.fireball_coords = {
-                        "x": fire_coords[0],
-                        "y": fire_coords[1],
-                        "range": 100,
-                        "direction": self.direction,
-                        "animate": 0}
-                    self.fireball_in_flight = True
 
-        if pyxel.btnp(pyxel.KEY_I):
+        if controls.btnp("KEY_P"):
+            self.profiler.toggle()
+        if controls.btnp("KEY_I"):
             if not self.inventory_up:
                 self.inventory_up = True
                 self.main_play = False
             else:
                 self.inventory_up = False
                 self.main_play = True
-        if pyxel.btnp(pyxel.KEY_RIGHT, hold=1, period=1):
-            if self.main_play:
-                self.direction = "right"
-                door_is_there, door_info = detect_door(
-                    pyxel, self.position, self.direction, self.doors)
-                if door_is_there:
-                    self.scene_name = self.doors[door_info]["gate"].get(
-                        "scene_name")
-                    self.position = {"x": self.doors[door_info]["gate"]["x"],
-                                     "y": self.doors[door_info]["gate"]["y"]}
-                    self.from_door = True
-                    self.scene_setup = False
-                    self.fireball_in_flight = False
-                    return None
-                if pyxel.btnp(pyxel.KEY_LEFT_SHIFT, hold=1, period=1):
-                    character_bubble = get_character_bubble(
-                        pyxel, self.position)
-                    if (
-                        13 in character_bubble[3] and
-                        9 not in character_bubble[3] and
-                        character_bubble[3] != [13, 13, 13, 13, 13, 13, 13]
-                    ):
-                        detect_movable_boulder(
-                            pyxel, character_bubble[3],
-                            self.direction,
-                            self.position,
-                            self.all_boulders[boulder_key])
-                if not collision_detect(pyxel, self.position,
-                                        self.direction,
-                                        self.all_boulders[boulder_key]):
-                    self.position["x"] += 1
-        if pyxel.btnp(pyxel.KEY_LEFT, hold=1, period=1):
-            if self.main_play:
-                self.direction = "left"
-                door_is_there, door_info = detect_door(
-                    pyxel, self.position, self.direction, self.doors)
-                if door_is_there:
-                    self.scene_name = self.doors[door_info]["gate"].get(
-                        "scene_name")
-                    self.position = {"x": self.doors[door_info]["gate"]["x"],
-                                     "y": self.doors[door_info]["gate"]["y"]}
-                    self.from_door = True
-                    self.scene_setup = False
-                    self.fireball_in_flight = False
-                    return None
-                if pyxel.btnp(pyxel.KEY_LEFT_SHIFT, hold=1, period=1):
-                    character_bubble = get_character_bubble(
-                        pyxel, self.position)
-                    if (
-                        13 in character_bubble[2] and
-                        9 not in character_bubble[2] and
-                        character_bubble[2] != [13, 13, 13, 13, 13, 13, 13]
-                    ):
-                        detect_movable_boulder(
-                            pyxel, character_bubble[2],
-                            self.direction,
-                            self.position,
-                            self.all_boulders[boulder_key])
-                if not collision_detect(pyxel, self.position,
-                                        self.direction,
-                                        self.all_boulders[boulder_key]):
-                    self.position["x"] -= 1
-        if pyxel.btnp(pyxel.KEY_UP, hold=1, period=1):
-            if self.main_play:
-                self.direction = "up"
-                door_is_there, door_info = detect_door(
-                    pyxel, self.position, self.direction, self.doors)
-                if door_is_there:
-                    self.scene_name = self.doors[door_info]["gate"].get(
-                        "scene_name")
-                    self.position = {"x": self.doors[door_info]["gate"]["x"],
-                                     "y": self.doors[door_info]["gate"]["y"]}
-                    self.from_door = True
-                    self.scene_setup = False
-                    self.fireball_in_flight = False
-                    return None
-                if pyxel.btnp(pyxel.KEY_LEFT_SHIFT, hold=1, period=1):
-                    character_bubble = get_character_bubble(
-                        pyxel, self.position)
-                    if (
-                        13 in character_bubble[1] and
-                        9 not in character_bubble[1] and
-                        character_bubble[1] != [13, 13, 13, 13, 13, 13]
-                    ):
-                        detect_movable_boulder(
-                            pyxel, character_bubble[1],
-                            self.direction,
-                            self.position,
-                            self.all_boulders[boulder_key])
-                if not collision_detect(pyxel, self.position,
-                                        self.direction,
-                                        self.all_boulders[boulder_key]):
-                    self.position["y"] -= 1
-        if pyxel.btnp(pyxel.KEY_DOWN, hold=1, period=1):
-            if self.main_play:
-                self.direction = "down"
-                door_is_there, door_info = detect_door(
-                    pyxel, self.position, self.direction, self.doors)
-                if door_is_there:
-                    self.scene_name = self.doors[door_info]["gate"].get(
-                        "scene_name"
-                    )
-                    self.position = {"x": self.doors[door_info]["gate"]["x"],
-                                     "y": self.doors[door_info]["gate"]["y"]}
-                    self.from_door = True
-                    self.scene_setup = False
-                    self.fireball_in_flight = False
-                    return None
-                if pyxel.btnp(pyxel.KEY_LEFT_SHIFT, hold=1, period=1):
-                    character_bubble = get_character_bubble(
-                        pyxel, self.position)
-                    if (
-                        13 in character_bubble[0] and
-                        9 not in character_bubble[0] and
-                        character_bubble[0] != [13, 13, 13, 13, 13, 13]
-                    ):
-                        detect_movable_boulder(
-                            pyxel, character_bubble[0],
-                            self.direction,
-                            self.position,
-                            self.all_boulders[boulder_key])
-                if not collision_detect(pyxel, self.position,
-                                        self.direction,
-                                        self.all_boulders[boulder_key]):
-                    self.position["y"] += 1
+        # Held directions are walked once per tick in move()
+        self.pulling = controls.btnp("KEY_LEFT_SHIFT", hold=1, period=1)
+        self.moves = [direction for direction, key in DIRECTIONS
+                      if self.main_play and
+                      controls.btnp(key, hold=1, period=1)]
+
+    def move(self):
+        for direction in self.moves:
+            self.direction = direction
+            door_id = move_player(
+                self.grid, self.position, direction, self.speed,
+                self.door_index, self.pulling, self.profiler)
+            if door_id is not None:
+                self.enter_door(door_id)
+                self.moves = []
+                return None
+
+    def enter_door(self, door_id):
+        gate = self.doors[door_id]["gate"]
+        self.scene_name = gate.get("scene_name")
+        self.position = {"x": gate["x"], "y": gate["y"]}
+        self.from_door = True
+        self.scene_setup = False
+        self.projectiles.clear()
 
     def draw_scene(self):
-        if self.health < 0:
-            self.death = True
+        pyxel = self.pyxel
+        if not self.clock.render():
+            # Behind on ticks: let this frame go undrawn
+            self.profiler.end_frame(self.clock)
+            return None
         if self.death:
             pyxel.cls(0)
             for i in range(1, 15):
@@ -219,147 +240,58 @@ class App:
                        41,
                        "YOU DIED",
                        10)
+            self.draw_queue.invalidate()
 
         if self.main_play and not self.death:
-            pyxel.cls(0)
-            if self.scene_name == "a1":
-                boulder_key = "a1_duplicate"
-                monster_key = "a1_duplicate"
-            else:
-                boulder_key = self.scene_name
-                monster_key = self.scene_name
-            if not self.scene_setup:
-                self.initialize_scene()
-            # Borders around the playable arena
-            for i in range(1, 15):
-                draw.stone_obstacle(pyxel, 0, i*8)
-                draw.stone_obstacle(pyxel, 152, i*8)
-            for i in range(1, 20):
-                draw.stone_obstacle(pyxel, i*8, 8)
-                draw.stone_obstacle(pyxel, i*8, 112)
-
-            # Draw the ground tiles
-
-            draw.ground(pyxel, self.ground)
-
-            # Draw fireball counter symbol
-            self.fire_frame = 0
-            if random.choice(range(0, 4)) == 0:
-                self.fire_frame += 1
-            if self.fire_frame == 4:
+            with self.profiler.section("sprites"):
+                # Draw fireball counter symbol
                 self.fire_frame = 0
+                if self.random.flicker(4):
+                    self.fire_frame += 1
+                if self.fire_frame == 4:
+                    self.fire_frame = 0
 
-            draw.fire(pyxel, self.fire_frame)
-            pyxel.text(29, 2, str(self.fireballs), 8)
-
-            # Draw life meter
-            draw.goblet(pyxel, 0, 0)
-            pyxel.text(8, 2, str(self.health), 8)
+                queue = self.draw_queue
+                sprites = self.sprites
+                queue.add(HUD, sprites["fire{}".format(self.fire_frame)],
+                          20, 0)
+                queue.text(HUD, 29, 2, str(self.fireballs), 8)
 
-            # move monsters
-            for i in range(0, len(self.monsters[monster_key])):
-                if not self.monsters[monster_key][i].get('dead', False):
-                    character_pixels = get_character_pixels(
-                        pyxel, self.position)
-                    monster_bubble = get_tile_bubble(
-                        pyxel, self.monsters[monster_key][i])
-                    if (random.choice(range(0, 6)) == 0 and
-                       (13 not in monster_bubble[1])):
-                        self.monsters[monster_key][i]["y"] += 1
-                        monster_position = [self.monsters[monster_key][i]["x"],
-                                            self.monsters[monster_key][i]["y"]]
-                        if monster_position in character_pixels:
-                            self.health -= 1
-                    if (random.choice(range(0, 6)) == 0 and
-                       (13 not in monster_bubble[2])):
-                        self.monsters[monster_key][i]["x"] += 1
-                        monster_position = [self.monsters[monster_key][i]["x"],
-                                            self.monsters[monster_key][i]["y"]]
-                        if monster_position in character_pixels:
-                            self.health -= 1
-                    if (random.choice(range(0, 6)) == 0 and
-                       (13 not in monster_bubble[0])):
-                        self.monsters[monster_key][i]["y"] -= 1
-                        monster_position = [self.monsters[monster_key][i]["x"],
-                                            self.monsters[monster_key][i]["y"]]
-                        if monster_position in character_pixels:
-                            self.health -= 1
-                    if (random.choice(range(0, 6)) == 0 and
-                       (13 not in monster_bubble[3])):
-                        self.monsters[monster_key][i]["x"] -= 1
-                        monster_position = [self.monsters[monster_key][i]["x"],
-                                            self.monsters[monster_key][i]["y"]]
-                        if monster_position in character_pixels:
-                            self.health -= 1
+                # Draw life meter
+                queue.add(HUD, sprites["goblet"], 0, 0)
+                queue.text(HUD, 8, 2, str(self.health), 8)
 
-            # Draw scene from YAML
-            for i in range(0, len(self.scene_texts)):
-                draw.scene_text(pyxel, self.scene_texts[i])
+                # Draw scene from YAML
+                for text in self.scene_texts:
+                    queue.text(TEXTS, text["x"], text["y"], text["text"],
+                               text["color"])
 
-            for i in range(0, len(self.all_boulders[boulder_key])):
-                draw.movable_boulder(pyxel, i, self.all_boulders[boulder_key])
+                boulder = sprites["boulder"]
+                for x, y in self.room.boulders():
+                    queue.add(BOULDERS, boulder, x, y)
 
-            for i in range(0, len(self.walls)):
-                draw.wall(pyxel, i, self.walls)
+                monster = sprites["monster"]
+                group = self.monster_group
+                for x, y in zip(group.x[group.alive].tolist(),
+                                group.y[group.alive].tolist()):
+                    queue.add(MONSTERS, monster, x, y)
 
-            for i in range(0, len(self.doors)):
-                draw.door(pyxel, self.doors[i])
+                queue.add(PLAYER, sprites["player_" + self.direction],
+                          self.position["x"], self.position["y"])
 
-            for i in range(0, len(self.monsters[monster_key])):
-                if not self.monsters[monster_key][i].get('dead', False):
-                    draw.monster(pyxel, self.monsters[monster_key][i])
+                for ball in self.projectiles.flying:
+                    queue.add(FIREBALL, sprites["fireball{}".format(
+                        ball["animate"])], ball["x"], ball["y"])
 
-            draw.main_character(pyxel, self.position, self.direction)
+            # Borders, ground, walls and doors, only where a sprite or
+            # number moved or changed since the last frame. The first frame
+            # of a scene blits all of it, which covers the whole screen, so
+            # there is never any need to clear it.
+            with self.profiler.section("background"):
+                queue.restore(pyxel)
 
-            if self.fireball_in_flight and not self.death:
-                fireball_coords = draw.fireball(pyxel, self.fireball_coords)
-                bubble = get_tile_bubble(pyxel, self.fireball_coords)
-                fire_bubble = get_fireball_bubble(pyxel, self.fireball_coords)
-                fireball_collide = False
-                enemy_hit = False
-                if self.fireball_coords["direction"] == "left":
-                    if 13 in bubble[3]:
-                        fireball_collide = True
-                    if 8 in fire_bubble[3]:
-                        enemy_hit = True
-                if self.fireball_coords["direction"] == "right":
-                    if 13 in bubble[2]:
-                        fireball_collide = True
-                    if 8 in fire_bubble[2]:
-                        enemy_hit = True
-                if self.fireball_coords["direction"] == "up":
-                    if 13 in bubble[0]:
-                        fireball_collide = True
-                    if 8 in fire_bubble[0]:
-                        enemy_hit = True
-                if self.fireball_coords["direction"] == "down":
-                    if 13 in bubble[1]:
-                        fireball_collide = True
-                    if 8 in fire_bubble[1]:
-                        enemy_hit = True
-
-                if not fireball_collide:
-                    self.fireball_coords["x"] = fireball_coords[0]
-                    self.fireball_coords["y"] = fireball_coords[1]
-                    self.fireball_coords["range"] -= 1
-                    self.fireball_coords["animate"] = fireball_coords[2]
-                    if self.fireball_coords["range"] <= 0:
-                        self.fireball_in_flight = False
-                        self.fireball_range = 10
-                else:
-                    self.fireball_in_flight = False
-                    self.fireball_range = 10
-
-                monster_coords = [(x["x"], x["y"])
-                                  for x in self.monsters[monster_key]]
-                fb_coords = (self.fireball_coords["x"],
-                             self.fireball_coords["y"])
-                if enemy_hit:
-                    monster_id = closest_point(fb_coords,
-                                               monster_coords)
-                    self.monsters[monster_key][monster_id]["dead"] = True
-                    self.fireball_in_flight = False
-                    self.fireball_range = 10
+            with self.profiler.section("sprites"):
+                queue.flush(pyxel)
 
         if self.inventory_up and not self.death:
             pyxel.cls(0)
@@ -380,6 +312,41 @@ class App:
                             {"x": 10, "y": 30,
                              "text": "Coins: {}".format(self.coins),
                              "color": 6})
+            self.draw_queue.invalidate()
+        self.profiler.overlay()
+        if self.profiler.visible:
+            # The overlay is drawn over the frame outside the queue
+            self.draw_queue.invalidate()
+        self.profiler.end_frame(self.clock)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dungeon DOS")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record", default=None,
+                        help="save the keys pressed in this session here")
+    parser.add_argument("--replay", default=None,
+                        help="play back a session saved with --record")
+    parser.add_argument("--profile", nargs="?", const="", default=None,
+                        help="time each frame, show the times with P and "
+                             "write them to this .csv or .jsonl file")
+    args = parser.parse_args()
+    import pyxel
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler(history=WINDOW, export=args.profile or None)
+    if args.replay:
+        session = load_session(args.replay)
+        App(pyxel, session["scene_name"], profiler, seed=session["seed"],
+            controls=InputReplay(session))
+    elif args.record:
+        # Recordings always start from a fresh game, not from the save
+        seed = new_seed() if args.seed is None else args.seed
+        App(pyxel, profiler=profiler, seed=seed,
+            controls=InputRecorder(pyxel, args.record, seed, "a1"))
+    else:
+        App(pyxel, profiler=profiler, journal=Journal(), seed=args.seed)
 
 
-App()
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,37 @@
 
 # Util and scenes directories must be added to this command for release
 
+python benchmark.py --budget-calls 50 --budget-pixels 4000 || exit 1
+
+python -m util.compile_scenes || exit 1
+
 pyinstaller --clean --noconfirm --log-level=WARN --onefile --noconsole --name=dungeon-dos \
 --add-data=$VIRTUAL_ENV/lib/python3.7/site-packages/pyxel/core/bin/linux/libpyxelcore.so:pyxel/core/bin/linux \
 --add-data=$PWD/assets/pyxel_logo_38x16.png:assets \
 --add-data=$PWD/assets/image_map.pyxres:assets \
 --add-data=$PWD/util/__init__.py:util \
+--add-data=$PWD/util/atlas.py:util \
+--add-data=$PWD/util/background.py:util \
+--add-data=$PWD/util/clock.py:util \
 --add-data=$PWD/util/collision.py:util \
 --add-data=$PWD/util/draw.py:util \
+--add-data=$PWD/util/draw_queue.py:util \
+--add-data=$PWD/util/grid.py:util \
 --add-data=$PWD/util/load_scene.py:util \
 --add-data=$PWD/util/load_world.py:util \
+--add-data=$PWD/util/monsters.py:util \
 --add-data=$PWD/util/movable.py:util \
+--add-data=$PWD/util/movement.py:util \
+--add-data=$PWD/util/pathfinding.py:util \
+--add-data=$PWD/util/prefetch.py:util \
+--add-data=$PWD/util/profiler.py:util \
+--add-data=$PWD/util/projectiles.py:util \
+--add-data=$PWD/util/replay.py:util \
+--add-data=$PWD/util/rng.py:util \
+--add-data=$PWD/util/save.py:util \
+--add-data=$PWD/util/spatial.py:util \
+--add-data=$PWD/util/world_pack.py:util \
+--add-data=$PWD/util/world_state.py:util \
 game.py
 
 cp -r $PWD/scenes/ dist/
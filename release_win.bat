@@ -1,6 +1,10 @@
 SET CURRENTDIR=%cd%
 SET PYTHONPATH=%userprofile%\appdata\local\programs\python\python37\lib\site-packages
 
+python benchmark.py --budget-calls 50 --budget-pixels 4000 || exit /b 1
+
+python -m util.compile_scenes || exit /b 1
+
 pyinstaller --clean --noconfirm --log-level=WARN --onefile --noconsole --name=dungeon-dos^
   --add-data=%PYTHONPATH%\pyxel\core\bin\win64\libjpeg-9.dll;pyxel/core/bin\win64^
   --add-data=%PYTHONPATH%\pyxel\core\bin\win64\libpng16-16.dll;pyxel/core/bin\win64^
@@ -13,11 +17,28 @@ pyinstaller --clean --noconfirm --log-level=WARN --onefile --noconsole --name=du
   --add-data=%CURRENTDIR%\assets\image_map.pyxres;assets^
   --add-data=%CURRENTDIR%\assets\pyxel_logo_38x16.png;assets^
   --add-data=%CURRENTDIR%\util\__init__.py;util^
+  --add-data=%CURRENTDIR%\util\atlas.py;util^
+  --add-data=%CURRENTDIR%\util\background.py;util^
+  --add-data=%CURRENTDIR%\util\clock.py;util^
   --add-data=%CURRENTDIR%\util\collision.py;util^
   --add-data=%CURRENTDIR%\util\draw.py;util^
+  --add-data=%CURRENTDIR%\util\draw_queue.py;util^
+  --add-data=%CURRENTDIR%\util\grid.py;util^
   --add-data=%CURRENTDIR%\util\load_scene.py;util^
   --add-data=%CURRENTDIR%\util\load_world.py;util^
+  --add-data=%CURRENTDIR%\util\monsters.py;util^
   --add-data=%CURRENTDIR%\util\movable.py;util^
+  --add-data=%CURRENTDIR%\util\movement.py;util^
+  --add-data=%CURRENTDIR%\util\pathfinding.py;util^
+  --add-data=%CURRENTDIR%\util\prefetch.py;util^
+  --add-data=%CURRENTDIR%\util\profiler.py;util^
+  --add-data=%CURRENTDIR%\util\projectiles.py;util^
+  --add-data=%CURRENTDIR%\util\replay.py;util^
+  --add-data=%CURRENTDIR%\util\rng.py;util^
+  --add-data=%CURRENTDIR%\util\save.py;util^
+  --add-data=%CURRENTDIR%\util\spatial.py;util^
+  --add-data=%CURRENTDIR%\util\world_pack.py;util^
+  --add-data=%CURRENTDIR%\util\world_state.py;util^
   game.py
 
 robocopy scenes dist/scenes /E
@@ -0,0 +1,46 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark import scripted_keys  # noqa: E402
+from game import App  # noqa: E402
+from util.clock import frame_clock  # noqa: E402
+from util.headless import HeadlessPyxel  # noqa: E402
+
+# A room for the tests that need one: ten monsters, so the dead flags fill
+# more than one byte, the second of them dead
+BOULDERS = [{"x": 8, "y": 16}, {"x": 24, "y": 32}]
+MONSTERS = [{"x": 40 + 8 * i, "y": 48, "dead": i == 1}
+            for i in range(0, 10)]
+
+
+@pytest.fixture(autouse=True)
+def in_repo(monkeypatch):
+    # Scenes and assets are found relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+def entities(name):
+    # Every room of a WorldState starts out as the room above
+    return BOULDERS, MONSTERS
+
+
+def room_arrays(room):
+    return [getattr(room, key).tolist() for key in (
+        "boulder_x", "boulder_y", "monster_x", "monster_y", "monster_alive")]
+
+
+def play(scene_name, frames, seed=0, each_frame=None):
+    # The benchmark's scripted walk, headless, one tick per frame.
+    # each_frame(frame, app) is called before every frame.
+    pyxel = HeadlessPyxel()
+    app = App(pyxel, scene_name, clock=frame_clock(pyxel), seed=seed)
+    for frame, keys in enumerate(scripted_keys(frames)):
+        if each_frame is not None:
+            each_frame(frame, app)
+        pyxel.step([getattr(pyxel, key) for key in keys])
+    app.monster_group.store()
+    return app
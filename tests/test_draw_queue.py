@@ -0,0 +1,100 @@
+import numpy as np
+from game import App
+from util.atlas import load_atlas
+from util.clock import frame_clock
+from util.draw_queue import merge
+from util.headless import HeadlessPyxel
+
+# From a1 up to the east door, through it into b1 and about there, firing
+# once on the way
+SCRIPT = [(["KEY_UP"], 26), (["KEY_RIGHT"], 100), (["KEY_DOWN"], 20),
+          (["KEY_F"], 1), (["KEY_RIGHT", "KEY_LEFT_SHIFT"], 15), ([], 10)]
+
+
+class RasterImage:
+    def __init__(self, pixels=None):
+        if pixels is None:
+            pixels = np.zeros((256, 256), dtype=np.uint8)
+        self.pixels = pixels
+
+    def set(self, x, y, data):
+        for i, row in enumerate(data):
+            self.pixels[y + i, x:x + len(row)] = [int(c, 16) for c in row]
+
+
+class RasterPyxel(HeadlessPyxel):
+    # Draws into a real 160x120 framebuffer. Text comes out as a made up
+    # pattern for each character, inside the cell Pyxel's font would use.
+    def __init__(self, atlas):
+        HeadlessPyxel.__init__(self)
+        self.images[0] = RasterImage(atlas)
+        self.screen = np.zeros((120, 160), dtype=np.uint8)
+
+    def image(self, img, system=False):
+        return self.images.setdefault(img, RasterImage())
+
+    def paint(self, x, y, pixels, mask):
+        h, w = pixels.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, 160), min(y + h, 120)
+        if x0 >= x1 or y0 >= y1:
+            return
+        pixels = pixels[y0 - y:y1 - y, x0 - x:x1 - x]
+        mask = mask[y0 - y:y1 - y, x0 - x:x1 - x]
+        self.screen[y0:y1, x0:x1][mask] = pixels[mask]
+
+    def cls(self, col):
+        HeadlessPyxel.cls(self, col)
+        self.screen[:] = col
+
+    def blt(self, x, y, img, u, v, w, h, colkey=-1):
+        HeadlessPyxel.blt(self, x, y, img, u, v, w, h, colkey)
+        pixels = self.images[img].pixels[v:v + h, u:u + w]
+        self.paint(x, y, pixels, pixels != colkey)
+
+    def rect(self, x, y, w, h, col):
+        HeadlessPyxel.rect(self, x, y, w, h, col)
+        self.paint(x, y, np.full((h, w), col, dtype=np.uint8),
+                   np.ones((h, w), dtype=bool))
+
+    def text(self, x, y, s, col):
+        HeadlessPyxel.text(self, x, y, s, col)
+        for i, char in enumerate(s):
+            mask = np.array([(ord(char) + 3 * row + column) % 3 == 0
+                             for row in range(0, 5)
+                             for column in range(0, 3)]).reshape(5, 3)
+            self.paint(x + 4 * i, y, np.full((5, 3), col, dtype=np.uint8),
+                       mask)
+
+
+def frames(full):
+    # The screen after every frame of the script, redrawing only what
+    # changed or, with full, the whole screen every frame
+    pyxel = RasterPyxel(load_atlas())
+    app = App(pyxel, "a1", clock=frame_clock(pyxel), seed=0)
+    screens = []
+    scenes = set()
+    for keys, length in SCRIPT:
+        for i in range(0, length):
+            if full:
+                app.draw_queue.invalidate()
+            pyxel.step([getattr(pyxel, key) for key in keys])
+            screens.append(pyxel.screen.copy())
+            scenes.add(app.scene_name)
+    return screens, scenes, pyxel.calls["blt_pixels"]
+
+
+def test_dirty_rectangles_draw_the_same_as_full_redraws():
+    dirty, scenes, dirty_pixels = frames(full=False)
+    full, scenes, full_pixels = frames(full=True)
+    assert scenes == {"a1", "b1"}
+    for frame, (screen, expected) in enumerate(zip(dirty, full)):
+        assert np.array_equal(screen, expected), frame
+    # and most of each frame was left as it was
+    assert dirty_pixels * 5 < full_pixels
+
+
+def test_merge_joins_the_steps_of_a_moving_sprite():
+    assert merge([(10, 10, 18, 18), (11, 10, 19, 18)]) == [(10, 10, 19, 18)]
+    assert merge([(0, 0, 8, 8), (100, 100, 108, 108)]) == [
+        (0, 0, 8, 8), (100, 100, 108, 108)]
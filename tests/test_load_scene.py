@@ -0,0 +1,35 @@
+import glob
+import os
+import pytest
+from util.compile_scenes import check_scene
+from util.load_scene import parse_scene, validate
+
+
+@pytest.mark.parametrize("data", [
+    {"position": 5},
+    {"walls": [5]},
+    {"walls": 5},
+    {"monsters": ["goblin"]},
+    {"door_info": [{"x": 8, "y": 8, "door_type": "red", "gate": 5}]},
+    {"ground_map": 5},
+    {"ground_map": {"legend": ["a"]}},
+    {"ground_map": {"rows": [1, 2]}},
+    {"ground_map": {"legend": {"a": [0, "8"]}}},
+])
+def test_malformed_scenes_raise_value_error(data):
+    with pytest.raises(ValueError):
+        validate(parse_scene("bad", data))
+
+
+@pytest.mark.parametrize("source", ["position: 5\n", "walls: [5]\n"])
+def test_check_scene_reports_malformed_scenes(tmp_path, source):
+    path = tmp_path / "bad.yaml"
+    path.write_text(source)
+    result = check_scene(str(path))
+    assert len(result["errors"]) == 1
+    assert "payload" not in result
+
+
+def test_shipped_scenes_have_no_errors():
+    for path in sorted(glob.glob(os.path.join("scenes", "*.yaml"))):
+        assert check_scene(path)["errors"] == [], path
@@ -0,0 +1,92 @@
+import itertools
+import numpy as np
+from util.atlas import load_atlas
+from util.grid import PAD, SceneGrid
+from util.movable import boulder_chain, detect_movable_boulder
+from util.world_state import RoomState
+
+
+def scene(boulders, walls=()):
+    room = RoomState("test", [{"x": x, "y": y} for x, y in boulders])
+    grid = SceneGrid(load_atlas(), [{"x": x, "y": y} for x, y in walls],
+                     [], room)
+    return grid
+
+
+def test_lone_boulder():
+    grid = scene([(40, 40)])
+    assert boulder_chain(grid, [0], "right") == [0]
+
+
+def test_row_of_boulders_moves_together():
+    grid = scene([(40, 40), (48, 40), (56, 40), (80, 40)])
+    assert boulder_chain(grid, [0], "right") == [0, 1, 2]
+    assert boulder_chain(grid, [2], "left") == [0, 1, 2]
+    assert boulder_chain(grid, [1], "up") == [1]
+
+
+def test_a_gap_breaks_the_chain():
+    grid = scene([(40, 40), (49, 40)])
+    assert boulder_chain(grid, [0], "right") == [0]
+
+
+def test_chain_branches_and_is_order_independent():
+    # 0 pushes both 1 and 2, which it half overlaps; 2 pushes 3
+    boulders = [(40, 40), (48, 36), (48, 44), (56, 48)]
+    grid = scene(boulders)
+    assert boulder_chain(grid, [0], "right") == [0, 1, 2, 3]
+    for seeds in itertools.permutations([1, 2]):
+        assert boulder_chain(grid, list(seeds), "right") == [1, 2, 3]
+
+
+def test_chain_into_a_wall_is_blocked():
+    grid = scene([(40, 40), (48, 40)], walls=[(56, 40)])
+    assert boulder_chain(grid, [0], "right") is None
+    assert boulder_chain(grid, [0], "left") == [0]
+
+
+def test_chain_into_the_border_is_blocked():
+    grid = scene([(136, 40), (144, 40)])
+    assert boulder_chain(grid, [0], "right") is None
+
+
+def test_pushing_moves_the_chain_and_the_grid():
+    grid = scene([(40, 40), (48, 40)])
+    # The player's 6x7 sprite right against the left of boulder 0
+    blocked = detect_movable_boulder(grid, "right", {"x": 34, "y": 40})
+    assert not blocked
+    assert list(grid.room.boulders()) == [(41, 40), (49, 40)]
+    fresh = scene(list(grid.room.boulders()))
+    assert np.array_equal(grid.cells, fresh.cells)
+    assert grid.boulder_index.positions == {0: (41, 40), 1: (49, 40)}
+
+
+def test_pushing_into_a_wall_moves_nothing():
+    grid = scene([(40, 40), (48, 40)], walls=[(56, 40)])
+    before = grid.cells[PAD:-PAD, PAD:-PAD].copy()
+    assert detect_movable_boulder(grid, "right", {"x": 34, "y": 40})
+    assert list(grid.room.boulders()) == [(40, 40), (48, 40)]
+    assert np.array_equal(grid.cells[PAD:-PAD, PAD:-PAD], before)
+
+
+def test_pulling_into_a_wall_moves_nothing():
+    # The player at (40, 40) pulls right the boulder behind them, which
+    # has a wall just ahead of its lower half
+    grid = scene([(33, 43)], walls=[(41, 48)])
+    assert detect_movable_boulder(grid, "right", {"x": 40, "y": 40},
+                                  pulling=True)
+    assert list(grid.room.boulders()) == [(33, 43)]
+
+
+def test_pulling_into_another_boulder_moves_nothing():
+    grid = scene([(33, 43), (41, 49)])
+    assert detect_movable_boulder(grid, "right", {"x": 40, "y": 40},
+                                  pulling=True)
+    assert list(grid.room.boulders()) == [(33, 43), (41, 49)]
+
+
+def test_pulling_a_free_boulder_moves_it():
+    grid = scene([(33, 43)])
+    assert not detect_movable_boulder(grid, "right", {"x": 40, "y": 40},
+                                      pulling=True)
+    assert list(grid.room.boulders()) == [(34, 43)]
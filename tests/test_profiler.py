@@ -0,0 +1,43 @@
+from util.clock import SimulationClock
+from util.headless import HeadlessPyxel
+from util.profiler import Profiler
+
+
+def test_frames_record_their_share_of_the_clock(tmp_path):
+    # A frame that falls 0.2 s behind is due six ticks: four run, two are
+    # dropped, and drawing it is skipped
+    times = iter([0.0, 1 / 30, 1 / 30 + 0.2, 2 / 30 + 0.2])
+    clock = SimulationClock(now=lambda: next(times))
+    path = tmp_path / "frames.csv"
+    profiler = Profiler(export=str(path))
+    for frame in range(0, 4):
+        clock.advance()
+        clock.render()
+        profiler.end_frame(clock)
+    profiler.close()
+    assert list(profiler.frame_clock) == [
+        {"ticks": 1, "dropped": 0, "skipped": 0},
+        {"ticks": 1, "dropped": 0, "skipped": 0},
+        {"ticks": 4, "dropped": 2, "skipped": 1},
+        {"ticks": 1, "dropped": 0, "skipped": 0}]
+    rows = path.read_text().splitlines()
+    assert rows[0].endswith(",ticks,dropped,skipped")
+    assert rows[3].endswith(",4,2,1")
+
+
+def test_overlay_shows_the_clock():
+    times = iter([0.0, 0.3])
+    clock = SimulationClock(now=lambda: next(times))
+    profiler = Profiler()
+    texts = []
+    pyxel = HeadlessPyxel()
+    pyxel.text = lambda x, y, s, col: texts.append(s)
+    profiler.wrap(pyxel)
+    for frame in range(0, 2):
+        clock.advance()
+        clock.render()
+        profiler.end_frame(clock)
+    profiler.toggle()
+    profiler.overlay()
+    assert "ticks 5   skip 1" in texts
+    assert "dropped 5" in texts
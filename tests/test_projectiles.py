@@ -0,0 +1,65 @@
+import numpy as np
+from util.atlas import load_atlas
+from util.grid import SceneGrid
+from util.monsters import MonsterGroup
+from util.projectiles import Projectiles, sweep
+from util.world_state import RoomState
+
+
+def boxes(*corners):
+    return (np.array([x for x, y in corners], dtype=float),
+            np.array([y for x, y in corners], dtype=float))
+
+
+def fly(monsters, walls=(), speed=1, start=(10, 40), ticks=200):
+    # Fire one fireball right from start and fly it until it goes out
+    room = RoomState("t", [], [{"x": x, "y": y} for x, y in monsters])
+    group = MonsterGroup(room, SceneGrid(load_atlas(), [], [], room).border)
+    projectiles = Projectiles([{"x": x, "y": y} for x, y in walls], [],
+                              speed)
+    projectiles.fire(start[0], start[1], "right")
+    killed = []
+    for tick in range(0, ticks):
+        if not projectiles.flying:
+            break
+        killed += projectiles.step(room, group)
+    return killed, group
+
+
+def test_hit_at_the_fraction_the_boxes_first_overlap():
+    # Moving 20 pixels, the fireball reaches the box grown to x 8..24 after
+    # 8 of them
+    assert sweep(0.0, 40.0, 20.0, 0.0, *boxes((16, 40))).tolist() == [0.4]
+    assert sweep(0.0, 40.0, 0.0, 20.0, *boxes((0, 50))).tolist() == [0.1]
+
+
+def test_box_overlapping_at_the_start_is_hit_at_once():
+    assert sweep(0.0, 40.0, 1.0, 0.0, *boxes((4, 44))).tolist() == [0.0]
+
+
+def test_near_miss():
+    # Level with the box's edge, and one pixel short of it at the end
+    times = sweep(0.0, 40.0, 20.0, 0.0, *boxes((16, 48), (16, 32), (29, 40)))
+    assert times.tolist() == [np.inf] * 3
+    # One pixel lower does overlap
+    assert sweep(0.0, 41.0, 20.0, 0.0, *boxes((16, 48))).tolist() == [0.4]
+
+
+def test_fast_fireball_does_not_pass_through_a_monster():
+    # 30 pixels a tick jumps clean over the monster's 8 pixels, from 10
+    # to 40, but the sweep still meets it on the way
+    killed, group = fly([(24, 40)], speed=30)
+    assert killed == [0]
+    assert not group.alive.any()
+
+
+def test_wall_stops_the_fireball_before_a_monster_behind_it():
+    for speed in (1, 30):
+        killed, group = fly([(34, 40)], walls=[(24, 40)], speed=speed)
+        assert killed == []
+        assert group.alive.all()
+
+
+def test_fireball_fizzles_out_of_range():
+    killed, group = fly([(140, 40)])
+    assert killed == []
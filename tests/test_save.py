@@ -0,0 +1,121 @@
+import marshal
+import numpy as np
+import util.save as save
+from conftest import BOULDERS, MONSTERS, entities, room_arrays
+from util.save import Journal, apply_room, encode_room, read_records
+from util.world_state import RoomState, WorldState
+
+PLAYER = {"scene_name": "a2", "x": 50, "y": 60, "health": 7,
+          "fireballs": 3, "coins": 5}
+
+
+def played_room(name="r"):
+    room = RoomState(name, BOULDERS, MONSTERS)
+    room.move_boulder(1, 3, -2)
+    alive = room.monster_alive.copy()
+    alive[[0, 7, 9]] = False
+    room.store_monsters(room.monster_x + 1, room.monster_y, alive)
+    return room
+
+
+def test_room_round_trip():
+    room = played_room()
+    fresh = RoomState("r", BOULDERS, MONSTERS)
+    assert apply_room(fresh, encode_room(room))
+    assert room_arrays(fresh) == room_arrays(room)
+    assert fresh.changed
+
+
+def test_room_from_another_scene_file_is_ignored():
+    payload = encode_room(played_room())
+    fewer = RoomState("r", BOULDERS, MONSTERS[:9])
+    assert not apply_room(fewer, payload)
+    assert room_arrays(fewer) == room_arrays(
+        RoomState("r", BOULDERS, MONSTERS[:9]))
+
+
+def journal_with(path, *rounds):
+    # One checkpoint per round, each moving boulder 0 of room "r" once
+    journal = Journal(str(path))
+    state = WorldState(entities)
+    for health in rounds:
+        state.room("r").move_boulder(0, 1, 0)
+        journal.checkpoint(state, dict(PLAYER, health=health))
+    journal.close()
+    return state
+
+
+def test_journal_restores_the_newest_records(tmp_path):
+    path = tmp_path / "journal.dat"
+    journal_with(path, 9, 8, 7)
+    journal = Journal(str(path))
+    assert journal.player()["health"] == 7
+    room = RoomState("r", BOULDERS, MONSTERS)
+    journal.restore(room)
+    assert room.boulder_x.tolist() == [11, 24]
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    path = tmp_path / "journal.dat"
+    journal_with(path, 9, 8)
+    intact = path.read_bytes()
+    # A crash halfway through writing the next record
+    torn = save.pack_record(save.PLAYER, b"x" * 40)[:30]
+    path.write_bytes(intact + torn)
+    journal = Journal(str(path))
+    assert journal.player()["health"] == 8
+    assert path.read_bytes() == intact
+    # and the next record goes straight after the intact ones
+    state = WorldState(entities)
+    journal.checkpoint(state, dict(PLAYER, health=4))
+    journal.close()
+    assert Journal(str(path)).player()["health"] == 4
+    assert len(list(read_records(path.read_bytes()))) == 5
+
+
+def test_corrupt_record_ends_the_journal(tmp_path):
+    path = tmp_path / "journal.dat"
+    journal_with(path, 9, 8)
+    data = bytearray(path.read_bytes())
+    # Flip a byte of the last record's payload
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    assert Journal(str(path)).player()["health"] == 9
+
+
+def test_compaction_keeps_only_the_newest_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(save, "COMPACT_MIN", 0)
+    path = tmp_path / "journal.dat"
+    journal_with(path, *range(0, 40))
+    data = path.read_bytes()
+    names = [name for name, start, length in read_records(data)]
+    # Without compaction there would be 80 records, two per checkpoint
+    assert sorted(set(names)) == sorted(["r", save.PLAYER])
+    assert len(names) <= 2 * (save.COMPACT_RATIO + 1)
+    journal = Journal(str(path))
+    assert journal.player()["health"] == 39
+    room = RoomState("r", BOULDERS, MONSTERS)
+    journal.restore(room)
+    assert room.boulder_x.tolist() == [48, 24]
+
+
+def test_checkpoint_copies_are_not_changed_by_later_play(tmp_path):
+    path = tmp_path / "journal.dat"
+    journal = Journal(str(path))
+    state = WorldState(entities)
+    state.room("r").move_boulder(0, 1, 0)
+    journal.checkpoint(state, PLAYER)
+    # Written while the writer thread may still be encoding the record
+    state.room("r").move_boulder(0, 100, 0)
+    journal.close()
+    room = RoomState("r", BOULDERS, MONSTERS)
+    Journal(str(path)).restore(room)
+    assert room.boulder_x.tolist() == [9, 24]
+    assert np.array_equal(state.room("r").boulder_x, [109, 24])
+
+
+def test_dead_flags_take_a_bit_each():
+    room = played_room()
+    data = marshal.loads(encode_room(room))
+    assert len(data["monster_dead"]) == 2
+    assert "monster_alive" not in data
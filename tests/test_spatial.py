@@ -0,0 +1,57 @@
+import random
+from util.spatial import SpatialHash
+
+
+def brute_nearest(points, x, y):
+    return min(((px - x)**2 + (py - y)**2, key)
+               for key, (px, py) in points.items())[1]
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(1)
+    for trial in range(0, 200):
+        index = SpatialHash()
+        points = dict()
+        for key in range(0, rng.randint(1, 40)):
+            points[key] = (rng.randint(0, 159), rng.randint(0, 119))
+            index.insert(key, *points[key])
+        for x, y in [(rng.randint(-20, 180), rng.randint(-20, 140))
+                     for query in range(0, 20)]:
+            assert index.nearest(x, y) == brute_nearest(points, x, y)
+
+
+def test_nearest_after_moves_and_removals():
+    rng = random.Random(2)
+    for trial in range(0, 200):
+        index = SpatialHash()
+        points = dict()
+        for key in range(0, rng.randint(2, 30)):
+            points[key] = (rng.randint(0, 159), rng.randint(0, 119))
+            index.insert(key, *points[key])
+        for key in list(points)[1:]:
+            if rng.random() < 0.5:
+                index.remove(key)
+                del points[key]
+            else:
+                points[key] = (rng.randint(0, 159), rng.randint(0, 119))
+                index.move(key, *points[key])
+        for x, y in [(rng.randint(0, 159), rng.randint(0, 119))
+                     for query in range(0, 20)]:
+            assert index.nearest(x, y) == brute_nearest(points, x, y)
+
+
+def test_nearest_of_empty_index():
+    index = SpatialHash()
+    assert index.nearest(10, 10) is None
+    index.insert("a", 10, 10)
+    index.remove("a")
+    assert index.nearest(10, 10) is None
+    index.insert("b", 150, 110)
+    assert index.nearest(0, 0) == "b"
+
+
+def test_in_rect_is_half_open():
+    index = SpatialHash()
+    index.insert("inside", 8, 8)
+    index.insert("edge", 16, 8)
+    assert index.in_rect(8, 8, 16, 16) == ["inside"]
@@ -0,0 +1,102 @@
+import numpy as np
+from conftest import BOULDERS, MONSTERS, entities, play, room_arrays
+from util.world_state import RoomState, WorldState
+
+
+def test_room_arrays():
+    room = RoomState("r", BOULDERS, MONSTERS)
+    assert list(room.boulders()) == [(8, 16), (24, 32)]
+    assert room.monster_alive.tolist() == [True, False] + [True] * 8
+    assert room.boulder_x.dtype == np.int16
+
+
+def test_copy_shares_until_the_live_room_writes():
+    room = RoomState("r", BOULDERS, MONSTERS)
+    twin = room.copy()
+    assert twin.boulder_x is room.boulder_x
+    room.move_boulder(0, 1, 0)
+    assert twin.boulder_x is not room.boulder_x
+    assert twin.boulder_x.tolist() == [8, 24]
+    assert room.boulder_x.tolist() == [9, 24]
+
+
+def test_store_monsters_leaves_copies_alone():
+    room = RoomState("r", BOULDERS, MONSTERS)
+    twin = room.copy()
+    room.store_monsters(np.arange(0, 10), np.arange(0, 10),
+                        np.zeros(10, dtype=bool))
+    assert twin.monster_x.tolist() == list(range(40, 120, 8))
+    assert twin.monster_alive.tolist()[:2] == [True, False]
+    assert room.monster_x.tolist() == list(range(0, 10))
+
+
+def test_only_the_first_write_after_a_copy_copies():
+    room = RoomState("r", BOULDERS, MONSTERS)
+    room.copy()
+    room.move_boulder(0, 1, 0)
+    owned = room.boulder_x
+    room.move_boulder(0, 1, 0)
+    assert room.boulder_x is owned
+
+
+def test_snapshot_is_isolated_from_the_live_world():
+    state = WorldState(entities)
+    live = state.room("a")
+    frozen = state.snapshot()
+    live.move_boulder(1, 0, -8)
+    assert frozen.rooms["a"].boulder_y.tolist() == [16, 32]
+    assert state.room("a").boulder_y.tolist() == [16, 24]
+
+
+def test_writes_mark_rooms_dirty():
+    state = WorldState(entities)
+    state.room("a")
+    state.room("b").move_boulder(0, 1, 0)
+    assert state.take_dirty() == ["b"]
+    assert state.take_dirty() == []
+
+
+def test_aliases_share_a_room():
+    state = WorldState(entities)
+    assert state.room("a1") is state.room("a1_duplicate")
+
+
+def test_evicted_rooms_keep_their_changes():
+    state = WorldState(entities, resident=1)
+    state.room("a").move_boulder(0, 5, 0)
+    state.room("b")
+    assert "a" not in state.rooms
+    assert state.room("a").boulder_x.tolist() == [13, 24]
+
+
+def test_snapshots_during_play_change_nothing():
+    for scene_name in ("a1", "a3"):
+        taken = dict()
+
+        def snapshot(frame, app):
+            if frame == 750:
+                app.monster_group.store()
+                taken["frozen"] = app.state.snapshot()
+                taken["copied"] = dict(
+                    (name, room_arrays(room))
+                    for name, room in taken["frozen"].rooms.items())
+
+        plain = play(scene_name, 1500)
+        app = play(scene_name, 1500, each_frame=snapshot)
+        assert (app.scene_name, app.position, app.health) == (
+            plain.scene_name, plain.position, plain.health)
+        assert room_arrays(app.room) == room_arrays(plain.room)
+        # and the rest of the run never wrote through to the snapshot
+        for name, room in taken["frozen"].rooms.items():
+            assert room_arrays(room) == taken["copied"][name]
+
+
+def test_spill_file_does_not_grow_going_back_and_forth():
+    state = WorldState(entities, resident=1)
+    for visit in range(0, 50):
+        state.room("ab"[visit % 2]).move_boulder(0, 1, 0)
+    size = state.spill.size
+    for visit in range(0, 50):
+        state.room("ab"[visit % 2]).move_boulder(0, 1, 0)
+    assert state.spill.size == size
+    assert state.room("a").boulder_x.tolist() == [58, 24]
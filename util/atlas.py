@@ -0,0 +1,92 @@
+import os
+import sys
+import zipfile
+from collections import namedtuple
+import numpy as np
+
+ATLAS_PATH = "assets/image_map.pyxres"
+
+# Atlas rectangles (u, v, w, h, colkey) used by the blt calls in util/draw.py
+STONE = (40, 0, 8, 8, -1)
+BOULDER = (48, 0, 8, 8, 0)
+WALL = (56, 8, 8, 8, 0)
+MONSTER = (0, 32, 8, 8, 0)
+DOORS = {"north": (56, 0, 8, 8, -1),
+         "south": (64, 0, 8, 8, -1),
+         "east": (80, 0, 8, 8, -1),
+         "west": (72, 0, 8, 8, -1)}
+GOBLET = (48, 8, 8, 8, -1)
+# Player facing each way, the fire counter's animation and the fireball's
+PLAYER = {"left": (9, 0, 6, 7, 1),
+          "right": (17, 0, 6, 7, 1),
+          "up": (33, 0, 6, 7, 1),
+          "down": (25, 0, 6, 7, 1)}
+FIRES = [(0, 16, 8, 8, -1), (8, 16, 8, 8, -1),
+         (0, 24, 8, 8, -1), (8, 24, 8, 8, -1)]
+FIREBALLS = [(0, 8, 8, 8, 0), (8, 8, 8, 8, 0)]
+# Four tiles cycled across the floor for each ground type
+GROUNDS = {"tiles": [[32, 8], [40, 8], [32, 16], [40, 16]],
+           "grass": [[16, 8], [24, 8], [16, 16], [24, 16]],
+           "swamp": [[16, 24], [24, 24], [16, 32], [24, 32]]}
+
+
+def load_atlas(path=ATLAS_PATH):
+    # Image bank 0 is stored as one line of hex digits per pixel row, so it
+    # can be read without opening a Pyxel window. Frozen builds unpack the
+    # assets next to the interpreter, the same place pyxel.load looks.
+    path = os.path.join(getattr(sys, "_MEIPASS", ""), path)
+    with zipfile.ZipFile(path) as z:
+        rows = z.read("pyxel_resource/image0").split()
+    digits = np.frombuffer(b"".join(rows), dtype=np.uint8)
+    pixels = np.where(digits >= ord('a'),
+                      digits - ord('a') + 10, digits - ord('0'))
+    return pixels.astype(np.uint8).reshape(len(rows), -1)
+
+
+# A registered sprite: where it is in image bank 0, and whether blt draws
+# every pixel of it, which lets it hide whatever is drawn underneath
+Sprite = namedtuple("Sprite", ["image", "u", "v", "w", "h", "colkey",
+                               "opaque"])
+
+
+def sprite_registry(atlas):
+    # Every sprite the game draws by name, looked up once at startup
+    rects = {"stone": STONE, "boulder": BOULDER, "wall": WALL,
+             "monster": MONSTER, "goblet": GOBLET}
+    for name, rect in DOORS.items():
+        rects["door_" + name] = rect
+    for name, rect in PLAYER.items():
+        rects["player_" + name] = rect
+    for i, rect in enumerate(FIRES):
+        rects["fire{}".format(i)] = rect
+    for i, rect in enumerate(FIREBALLS):
+        rects["fireball{}".format(i)] = rect
+    registry = dict()
+    for name, rect in rects.items():
+        pixels, mask = sprite(atlas, rect)
+        registry[name] = Sprite(0, *rect, opaque=bool(mask.all()))
+    return registry
+
+
+def sprite(atlas, rect):
+    # Pixels of one atlas rectangle and the mask of the ones blt would draw
+    u, v, w, h, colkey = rect
+    pixels = atlas[v:v + h, u:u + w]
+    if colkey < 0:
+        return pixels, np.ones(pixels.shape, dtype=bool)
+    return pixels, pixels != colkey
+
+
+def stamp(layer, origin, pixels, mask, x, y):
+    # Copy the drawn pixels of a sprite at (x, y) into a layer whose top
+    # left corner sits at arena coordinates origin, clipping at its edges.
+    height, width = layer.shape
+    left, top = x - origin[0], y - origin[1]
+    x0, y0 = max(left, 0), max(top, 0)
+    x1 = min(left + pixels.shape[1], width)
+    y1 = min(top + pixels.shape[0], height)
+    if x0 >= x1 or y0 >= y1:
+        return
+    part = np.s_[y0 - top:y1 - top, x0 - left:x1 - left]
+    target = layer[y0:y1, x0:x1]
+    target[mask[part]] = pixels[part][mask[part]]
@@ -0,0 +1,70 @@
+import numpy as np
+from util.atlas import DOORS, GROUNDS, STONE, WALL, sprite, stamp
+from util.grid import HEIGHT, WIDTH, border_tiles
+
+# Spare image bank the static layer of the current scene is uploaded to
+BACKGROUND_BANK = 1
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+# The floor is 18 by 12 tiles, from (8, 16) to (152, 112)
+GROUND_COLUMNS = 18
+GROUND_ROWS = 12
+GROUND_ORIGIN = (8, 16)
+
+
+def ground_tiles(ground, ground_map=None):
+    # Walks the floor column by column, cycling through four tiles.
+    # A ground map then replaces the tiles its rows give a legend entry for.
+    cycle = []
+    counter = 0
+    for i in range(1, 19):
+        for j in range(1, 14):
+            if j*8 + 8 != 112:
+                cycle.append((i*8, j*8 + 8, counter))
+            counter = 0 if counter == 3 else counter + 1
+    chosen = map_cells(ground_map) if ground_map else {}
+    tiles = []
+    for x, y, counter in cycle:
+        tile = chosen.get((x, y), ground)
+        if isinstance(tile, str) or tile is None:
+            tile = GROUNDS.get(tile, [[0, 0], [0, 0], [0, 0], [0, 0]])[counter]
+        tiles.append((x, y, tile))
+    return tiles
+
+
+def map_cells(ground_map):
+    # A legend entry is a ground type, which keeps that type's four tile
+    # cycle, or the [u, v] of one tile in image bank 0
+    legend = ground_map.get("legend", {})
+    cells = dict()
+    for row, line in enumerate(ground_map.get("rows", [])[:GROUND_ROWS]):
+        for column, char in enumerate(line[:GROUND_COLUMNS]):
+            if char in legend:
+                cells[(GROUND_ORIGIN[0] + column*8,
+                       GROUND_ORIGIN[1] + row*8)] = legend[char]
+    return cells
+
+
+def compose_background(atlas, ground, walls, doors, ground_map=None):
+    # Everything in a scene that never changes while the player is in it
+    pixels = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    stone = sprite(atlas, STONE)
+    for x, y in border_tiles():
+        stamp(pixels, (0, 0), *stone, x, y)
+    for x, y, (u, v) in ground_tiles(ground, ground_map):
+        stamp(pixels, (0, 0), *sprite(atlas, (u, v, 8, 8, -1)), x, y)
+    wall = sprite(atlas, WALL)
+    for info in walls:
+        stamp(pixels, (0, 0), *wall, info["x"], info["y"])
+    for info in doors:
+        stamp(pixels, (0, 0), *sprite(atlas, DOORS[info["door_type"]]),
+              info["x"], info["y"])
+    return pixels
+
+
+def to_rows(pixels):
+    # Image.set takes one string of hex digits per row
+    return [row.tobytes().decode() for row in HEX_DIGITS[pixels]]
+
+
+def upload(pyxel, rows, bank=BACKGROUND_BANK):
+    pyxel.image(bank).set(0, 0, rows)
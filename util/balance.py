@@ -0,0 +1,257 @@
+# Plays thousands of seeded play-throughs of every room with monsters, with
+# no display, for tuning how many monsters a room has and how much health
+# the player starts with. Each play-through drops the player in at one of
+# the ways into the room and runs the game's own movement, monsters and
+# fireballs until the room is cleared, the player dies or time runs out.
+# Play-throughs are spread over every core, and the results are written as
+# one column per statistic to a compressed .npz file.
+#
+#     python -m util.balance [--runs 1000] [--ticks 1800] [--player walk]
+#                            [--out balance.npz] [ROOM ...]
+
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from util.atlas import load_atlas
+from util.draw import start_fireball
+from util.grid import SceneGrid
+from util.load_scene import load_scene
+from util.monsters import MonsterGroup
+from util.movement import PLAYER_SPEED, move_player
+from util.pathfinding import FlowField
+from util.projectiles import RANGE, SIZE, VELOCITY, Projectiles
+from util.rng import EngineRandom
+from util.solve_scenes import entries, place
+from util.spatial import SpatialHash
+from util.world_state import RoomState, room_key
+
+RUNS = 1000
+# Ticks before a play-through is given up, a minute at 30 ticks per second
+TICKS = 1800
+OUTPUT = "balance.npz"
+# What the player starts the game with, as in game.py
+HEALTH = 10
+FIREBALLS = 10
+# Play-throughs handed to a worker at a time
+CHUNK = 50
+# Ticks the random walker keeps going one way
+HOLD = (8, 40)
+
+
+def lined_up(position, direction, monsters):
+    # Whether a fireball set off now would fly into a living monster, walls
+    # and boulders aside
+    living = monsters.living()
+    if not len(living):
+        return False
+    dx, dy = VELOCITY[direction]
+    x, y = start_fireball(position, direction)
+    off_x = monsters.x[living] - x
+    off_y = monsters.y[living] - y
+    ahead = off_x * dx + off_y * dy
+    across = off_x * abs(dy) + off_y * abs(dx)
+    return bool(((ahead > -SIZE) & (ahead < RANGE) &
+                 (abs(across) < SIZE)).any())
+
+
+class Walker:
+    # Walks a random way for a random while, and fires whenever a monster
+    # is lined up ahead
+    def __init__(self, random):
+        self.random = random
+        self.direction = None
+        self.left = 0
+
+    def wander(self):
+        if self.left <= 0:
+            self.direction = sorted(VELOCITY)[self.random.randint(0, 4)]
+            self.left = self.random.randint(*HOLD)
+        self.left -= 1
+        return self.direction
+
+    def choose(self, position, direction, monsters, stuck):
+        if stuck:
+            self.left = 0
+        return self.wander(), lined_up(position, direction, monsters)
+
+
+class Hunter(Walker):
+    # Lines up with the nearest monster and walks at it, firing once it is
+    # ahead. Wanders for a while when a wall is in the way.
+    def choose(self, position, direction, monsters, stuck):
+        fire = lined_up(position, direction, monsters)
+        if stuck:
+            self.left = self.random.randint(*HOLD)
+            self.direction = sorted(VELOCITY)[self.random.randint(0, 4)]
+        if self.left > 0 or not monsters.alive.any():
+            return self.wander(), fire
+        target = monsters.closest(position["x"], position["y"])
+        gap_x = int(monsters.x[target]) - position["x"]
+        gap_y = int(monsters.y[target]) - position["y"]
+        # Close the smaller gap first, then walk along the other
+        if abs(gap_x) <= abs(gap_y):
+            level = abs(gap_x) >= SIZE // 2
+        else:
+            level = abs(gap_y) < SIZE // 2
+        if level:
+            return ("right" if gap_x > 0 else "left"), fire
+        return ("down" if gap_y > 0 else "up"), fire
+
+
+PLAYERS = {"walk": Walker, "hunt": Hunter}
+
+
+def play_room(job):
+    # A run of play-throughs of one room, one per seed, each starting the
+    # room afresh. Gives back a list per column for balance() to stack.
+    name, ways_in, seeds, ticks, player = job
+    scene = load_scene(name)
+    room = RoomState(name, scene.mv_boulders, scene.monsters)
+    grid = SceneGrid(load_atlas(), scene.walls, scene.doors, room)
+    field = FlowField(scene.walls, scene.doors)
+    door_index = SpatialHash()
+    for i, door in enumerate(scene.doors):
+        door_index.insert(i, door["x"], door["y"])
+    start_x, start_y = room.boulder_x.copy(), room.boulder_y.copy()
+    columns = dict((key, []) for key in (
+        "seed", "entry", "damage", "died", "cleared", "clear_ticks",
+        "ticks", "fireballs_used", "kills"))
+    for seed in seeds:
+        place(grid, start_x, start_y)
+        random = EngineRandom(seed)
+        # The player's choices draw from their own generator, so a change
+        # of player never changes where the monsters go
+        choices = np.random.RandomState(seed)
+        walker = PLAYERS[player](choices)
+        entry = choices.randint(0, len(ways_in))
+        position = dict(ways_in[entry])
+        direction = scene.direction
+        monsters = MonsterGroup(room, grid.border, field)
+        projectiles = Projectiles(scene.walls, scene.doors)
+        health, fireballs = HEALTH, FIREBALLS
+        stuck = False
+        cleared = -1
+        tick = 0
+        while tick < ticks and health >= 0 and cleared < 0:
+            move, fire = walker.choose(position, direction, monsters, stuck)
+            if fire and fireballs >= 1:
+                x, y = start_fireball(position, direction)
+                if projectiles.fire(x, y, direction):
+                    fireballs -= 1
+            # Doors do not lead anywhere here, the player stays in the room
+            before = (position["x"], position["y"])
+            direction = move
+            move_player(grid, position, move, PLAYER_SPEED, door_index)
+            stuck = before == (position["x"], position["y"])
+            health -= monsters.step(position, random)
+            if projectiles.flying:
+                projectiles.step(room, monsters)
+            tick += 1
+            if not monsters.alive.any():
+                cleared = tick
+        columns["seed"].append(seed)
+        columns["entry"].append(entry)
+        columns["damage"].append(HEALTH - health)
+        columns["died"].append(health < 0)
+        columns["cleared"].append(cleared >= 0)
+        columns["clear_ticks"].append(cleared)
+        columns["ticks"].append(tick)
+        columns["fireballs_used"].append(FIREBALLS - fireballs)
+        columns["kills"].append(
+            int(np.count_nonzero(room.monster_alive & ~monsters.alive)))
+    return name, columns
+
+
+# Column types in the output file
+COLUMNS = (("seed", np.int64), ("entry", np.int8), ("damage", np.int16),
+           ("died", bool), ("cleared", bool), ("clear_ticks", np.int32),
+           ("ticks", np.int32), ("fireballs_used", np.int16),
+           ("kills", np.int16))
+
+
+def balance(rooms=None, runs=RUNS, ticks=TICKS, player="walk", seed=0,
+            output=OUTPUT, workers=None, report=print):
+    names = sorted(os.path.basename(path).replace('.yaml', '')
+                   for path in glob.glob(os.path.join("scenes", "*.yaml")))
+    unknown = [name for name in rooms or () if name not in names]
+    if unknown:
+        raise ValueError("no scene file for {}".format(", ".join(unknown)))
+    named = bool(rooms)
+    ways_in = entries(names)
+    playable = []
+    for name in sorted(set(room_key(name) for name in (rooms or names))):
+        has_monsters = bool(load_scene(name).monsters)
+        if not has_monsters:
+            # Only worth saying for rooms asked for by name
+            if named:
+                report("{}: skipped, it has no monsters".format(name))
+        elif not ways_in[name]:
+            report("{}: skipped, no door leads into it".format(name))
+        else:
+            playable.append(name)
+    rooms = playable
+    if not rooms:
+        raise ValueError("no rooms with monsters to play")
+    # The same seeds in every room, so rooms are compared on equal terms
+    seeds = list(range(seed, seed + runs))
+    jobs = [(name, ways_in[name], seeds[i:i + CHUNK], ticks, player)
+            for name in rooms for i in range(0, runs, CHUNK)]
+    found = dict((name, []) for name in rooms)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, columns in pool.map(play_room, jobs):
+            found[name].append(columns)
+
+    # Rooms go in the file once, as names, and every play-through refers
+    # to its room by number
+    data = {"rooms": np.array(rooms), "monsters": np.array(
+        [len(load_scene(name).monsters) for name in rooms], dtype=np.int16),
+        "room": np.repeat(np.arange(len(rooms), dtype=np.int16), runs)}
+    for key, dtype in COLUMNS:
+        data[key] = np.array([value for name in rooms
+                              for columns in found[name]
+                              for value in columns[key]], dtype=dtype)
+    np.savez_compressed(output, **data)
+
+    report("{:<14}{:>9}{:>8}{:>8}{:>9}{:>10}{:>10}".format(
+        "room", "monsters", "damage", "died", "cleared", "clear at",
+        "fireballs"))
+    for i, name in enumerate(rooms):
+        mine = data["room"] == i
+        clear_ticks = data["clear_ticks"][mine & data["cleared"]]
+        report("{:<14}{:>9}{:>8.1f}{:>7.0f}%{:>8.0f}%{:>10}{:>10.1f}".format(
+            name, data["monsters"][i], data["damage"][mine].mean(),
+            100 * data["died"][mine].mean(),
+            100 * data["cleared"][mine].mean(),
+            int(np.median(clear_ticks)) if len(clear_ticks) else "-",
+            data["fireballs_used"][mine].mean()))
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play every room with monsters many times over and "
+                    "collect how it went")
+    parser.add_argument("rooms", nargs="*",
+                        help="rooms to play, all with monsters by default")
+    parser.add_argument("--runs", type=int, default=RUNS,
+                        help="play-throughs of each room")
+    parser.add_argument("--ticks", type=int, default=TICKS,
+                        help="ticks before a play-through is given up")
+    parser.add_argument("--player", choices=sorted(PLAYERS), default="walk",
+                        help="walk at random, or hunt the nearest monster")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first play-through")
+    parser.add_argument("--out", default=OUTPUT)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        balance(args.rooms, args.runs, args.ticks, args.player, args.seed,
+                args.out, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+
+# Pyxel's default frame rate, which the game was tuned for
+TICKS_PER_SECOND = 30
+# Most ticks run in one frame before the rest of the backlog is dropped,
+# so a long stall does not turn into a burst of catch-up ticks
+MAX_TICKS = 4
+# Most frames in a row that may go undrawn while catching up
+MAX_SKIP = 2
+# Slack for the float rounding of the accumulator
+EPSILON = 1e-9
+
+
+class SimulationClock:
+    # Fixed-timestep accumulator. Each frame advance() says how many
+    # simulation ticks are due for the time that passed since the last
+    # frame, and render() whether to draw this frame or skip it.
+    def __init__(self, rate=TICKS_PER_SECOND, max_ticks=MAX_TICKS,
+                 max_skip=MAX_SKIP, now=time.perf_counter):
+        self.tick = 1.0 / rate
+        self.max_ticks = max_ticks
+        self.max_skip = max_skip
+        self.now = now
+        self.last = None
+        self.accumulator = 0.0
+        self.due = 0
+        self.skipping = 0
+        # Counters for whoever needs to know how often the host falls behind
+        self.frames = 0
+        self.ticks = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def advance(self):
+        now = self.now()
+        if self.last is None:
+            # The first frame runs one tick, whatever happened before it
+            self.accumulator = self.tick
+        else:
+            self.accumulator += now - self.last
+        self.last = now
+        due = int((self.accumulator + EPSILON) / self.tick)
+        self.accumulator -= due * self.tick
+        if due > self.max_ticks:
+            self.dropped += due - self.max_ticks
+            due = self.max_ticks
+        self.frames += 1
+        self.ticks += due
+        self.due = due
+        return due
+
+    def render(self):
+        # Skip drawing frames that had to catch up on ticks, but never more
+        # than max_skip of them in a row
+        if self.due > 1 and self.skipping < self.max_skip:
+            self.skipping += 1
+            self.skipped += 1
+            return False
+        self.skipping = 0
+        return True
+
+    def counters(self):
+        return {"frames": self.frames, "ticks": self.ticks,
+                "dropped": self.dropped, "skipped": self.skipped}
+
+
+def frame_clock(pyxel, rate=TICKS_PER_SECOND):
+    # A clock that sees exactly one tick pass per frame, for headless runs
+    # that have to play out the same way on every machine
+    return SimulationClock(rate, now=lambda: pyxel.frame_count / rate)
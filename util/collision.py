@@ -1,183 +1,54 @@
-from util.movable import detect_movable_boulder, closest_point
-
-
-def detect_door(pyxel, position, direction, door_info):
+from util.movable import detect_movable_boulder
+
+
+# Side of the character bubble (north, south, east, west) each direction
+# of travel looks at
+SIDES = {"up": 0, "down": 1, "right": 2, "left": 3}
+# What the bubble side reads when the character is lined up with a door
+DOOR_PATTERNS = {"up": ([9, 9, 4, 4, 9, 9],
+                        [9, 4, 4, 9, 9, 9],
+                        [9, 9, 9, 4, 4, 9]),
+                 "down": ([9, 9, 4, 4, 9, 9],
+                          [9, 4, 4, 9, 9, 9],
+                          [9, 9, 9, 4, 4, 9]),
+                 "left": ([9, 9, 9, 4, 4, 9, 9],
+                          [9, 9, 4, 4, 9, 9, 9]),
+                 "right": ([9, 9, 9, 4, 4, 9, 9],
+                           [9, 9, 4, 4, 9, 9, 9])}
+
+
+def detect_door(grid, position, direction, door_index, bubble=None):
     # Detect doors to trigger movement to new stage
     # Don't put two doors next to each other, they should be next to walls
-    north, south, east, west = get_character_bubble(pyxel, position)
-    if direction == "up":
-        if (
-                north == [9, 9, 4, 4, 9, 9] or
-                north == [9, 4, 4, 9, 9, 9] or
-                north == [9, 9, 9, 4, 4, 9]
-        ):
-            door_coords = [(x["x"], x["y"]) for x in door_info]
-            character_coords = (position["x"], position["y"])
-            return True, closest_point(character_coords, door_coords)
-    if direction == "down":
-        if (
-                south == [9, 9, 4, 4, 9, 9] or
-                south == [9, 4, 4, 9, 9, 9] or
-                south == [9, 9, 9, 4, 4, 9]
-        ):
-            door_coords = [(x["x"], x["y"]) for x in door_info]
-            character_coords = (position["x"], position["y"])
-            return True, closest_point(character_coords, door_coords)
-    if direction == "left":
-        if (
-                west == [9, 9, 9, 4, 4, 9, 9] or
-                west == [9, 9, 4, 4, 9, 9, 9]
-        ):
-            door_coords = [(x["x"], x["y"]) for x in door_info]
-            character_coords = (position["x"], position["y"])
-            return True, closest_point(character_coords, door_coords)
-    if direction == "right":
-        if (
-                east == [9, 9, 9, 4, 4, 9, 9] or
-                east == [9, 9, 4, 4, 9, 9, 9]
-        ):
-            door_coords = [(x["x"], x["y"]) for x in door_info]
-            character_coords = (position["x"], position["y"])
-            return True, closest_point(character_coords, door_coords)
+    if bubble is None:
+        bubble = get_character_bubble(grid, position)
+    if bubble[SIDES[direction]] in DOOR_PATTERNS[direction]:
+        return True, door_index.nearest(position["x"], position["y"])
     return False, False
 
 
-def get_character_bubble(pyxel, position):
-    north = []
-    south = []
-    east = []
-    west = []
-    for i in range(0, 6):
-        north.append(
-            pyxel.pget(position["x"] + i, position["y"] - 1)
-            )
-        south.append(
-            pyxel.pget(position["x"] + i, position["y"] + 7)
-        )
-    for i in range(0, 7):
-        east.append(
-            pyxel.pget(position["x"] + 6, position["y"] + i)
-        )
-        west.append(
-            pyxel.pget(position["x"] - 1, position["y"] + i)
-        )
+def get_character_bubble(grid, position):
+    x, y = position["x"], position["y"]
+    north = grid.hline(x, x + 6, y - 1)
+    south = grid.hline(x, x + 6, y + 7)
+    east = grid.vline(x + 6, y, y + 7)
+    west = grid.vline(x - 1, y, y + 7)
     return [north, south, east, west]
 
 
-def get_character_pixels(pyxel, position):
-    character_points = []
-    for i in range(0, 6):
-        for j in range(0, 7):
-            character_points.append([position["x"] + i, position["y"] + j])
-    return character_points
-
-
-def collision_detect(pyxel, position, direction, mv_boulders):
+def collision_detect(grid, position, direction, bubble=None):
     # Detect collisions with borders and walls
     border_color = 13
-    north, south, east, west = get_character_bubble(pyxel, position)
-
-    if direction == "left":
-        if 2 in west:
-            return True
-        if border_color in west:
-            boulder_exists = detect_movable_boulder(
-                                pyxel, west, direction,
-                                position, mv_boulders)
-            if boulder_exists:
-                return True
-            else:
-                bubble = get_character_bubble(pyxel, position)[3]
-                if (13 in bubble or 2 in bubble):
-                    return True
-        else:
-            return False
-    if direction == "right":
-        if 2 in east:
-            return True
-        if border_color in east:
-            boulder_exists = detect_movable_boulder(
-                                pyxel, east, direction,
-                                position, mv_boulders)
-            if boulder_exists:
-                return True
-            else:
-                bubble = get_character_bubble(pyxel, position)[2]
-                if (13 in bubble or 2 in bubble):
-                    return True
-        else:
-            return False
-    if direction == "up":
-        if 2 in north:
+    if bubble is None:
+        bubble = get_character_bubble(grid, position)
+    edge = bubble[SIDES[direction]]
+    if 2 in edge:
+        return True
+    if border_color in edge:
+        boulder_exists = detect_movable_boulder(grid, direction, position)
+        if boulder_exists:
             return True
-        if border_color in north:
-            boulder_exists = detect_movable_boulder(
-                                    pyxel, north, direction,
-                                    position, mv_boulders)
-            if boulder_exists:
-                return True
-            else:
-                bubble = get_character_bubble(pyxel, position)[0]
-                if (13 in bubble or 2 in bubble):
-                    return True
-        else:
-            return False
-    if direction == "down":
-        if 2 in south:
-            return True
-        if border_color in south:
-            boulder_exists = detect_movable_boulder(
-                                pyxel, south, direction,
-                                position, mv_boulders)
-            if boulder_exists:
-                return True
-            else:
-                bubble = get_character_bubble(pyxel, position)[1]
-                if (13 in bubble or 2 in bubble):
-                    return True
-        else:
-            return False
-
-
-def get_tile_bubble(pyxel, position):
-    north = []
-    south = []
-    east = []
-    west = []
-    for i in range(1, 9):
-        north.append(
-            pyxel.pget(position["x"] + i, position["y"] - 1)
-            )
-        south.append(
-            pyxel.pget(position["x"] + i, position["y"] + 8)
-        )
-    for i in range(1, 9):
-        east.append(
-            pyxel.pget(position["x"] + 9, position["y"] + i)
-        )
-        west.append(
-            pyxel.pget(position["x"] - 1, position["y"] + i)
-        )
-    return [north, south, east, west]
-
-
-def get_fireball_bubble(pyxel, position):
-    north = []
-    south = []
-    east = []
-    west = []
-    for i in range(1, 9):
-        north.append(
-            pyxel.pget(position["x"] + i, position["y"] - 1)
-            )
-        south.append(
-            pyxel.pget(position["x"] + i, position["y"] + 8)
-        )
-    for i in range(1, 9):
-        east.append(
-            pyxel.pget(position["x"] + 8, position["y"] + i)
-        )
-        west.append(
-            pyxel.pget(position["x"] - 1, position["y"] + i)
-        )
-    return [north, south, east, west]
+        # The boulder was pushed, look again at what is left in front
+        edge = get_character_bubble(grid, position)[SIDES[direction]]
+        return 13 in edge or 2 in edge
+    return False
@@ -0,0 +1,177 @@
+# Checks every scene in scenes/ and compiles them into a validated world
+# pack. Rooms are checked in parallel; doors between rooms are checked once
+# all of them are in. Errors stop the pack from being written.
+#
+#     python -m util.compile_scenes [--strict]
+
+import argparse
+import glob
+import marshal
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+from util.grid import HEIGHT, WIDTH
+from util.load_scene import parse_scene, validate
+from util.world_pack import PACK_PATH, VALIDATED, write_pack
+from util.world_state import room_key
+
+# Top level keys a scene file may have
+KEYS = ["position", "direction", "mv_boulders", "walls", "texts",
+        "door_info", "ground", "ground_map", "monsters"]
+DIRECTIONS = ["left", "right", "up", "down"]
+# Tiles are 8x8 and the player 6x7; all of them have to stay on screen
+TILE = 8
+PLAYER = (6, 7)
+
+
+def inside(x, y, width, height):
+    return (isinstance(x, int) and isinstance(y, int) and
+            0 <= x <= WIDTH - width and 0 <= y <= HEIGHT - height)
+
+
+def overlaps(a, b):
+    return (abs(a["x"] - b["x"]) < TILE and abs(a["y"] - b["y"]) < TILE)
+
+
+def normalise(record):
+    # Every field present, so loading from the pack needs no defaults
+    monsters = [{"x": m["x"], "y": m["y"],
+                 "monster_type": m.get("monster_type"),
+                 "dead": bool(m.get("dead", False))}
+                for m in record.monsters]
+    return {"position": record.position, "direction": record.direction,
+            "mv_boulders": record.mv_boulders, "walls": record.walls,
+            "texts": record.texts, "door_info": record.doors,
+            "ground": record.ground, "ground_map": record.ground_map,
+            "monsters": monsters}
+
+
+def check_scene(path):
+    # One room on its own, read and checked from its file alone. Anything
+    # that makes the scene unusable is an error; oddities the game copes
+    # with are warnings.
+    name = os.path.basename(path).replace('.yaml', '')
+    errors, warnings = [], []
+    result = {"name": name, "errors": errors, "warnings": warnings}
+    # Taken before reading, so a change made meanwhile leaves the pack
+    # looking stale rather than fresh
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        source = f.read()
+    result["source"] = (zlib.crc32(source), stat.st_size, stat.st_mtime_ns)
+    try:
+        data = yaml.safe_load(source)
+    except yaml.YAMLError as e:
+        errors.append("not valid YAML: {}".format(e))
+        return result
+    if data is not None and not isinstance(data, dict):
+        errors.append("not a mapping of scene keys")
+        return result
+    for key in sorted(data or {}):
+        if key not in KEYS:
+            warnings.append("unknown key {!r}".format(key))
+    try:
+        record = validate(parse_scene(name, data))
+    except (ValueError, AttributeError, TypeError) as e:
+        errors.append(str(e))
+        return result
+
+    if record.direction not in DIRECTIONS:
+        errors.append("direction {!r} is not one of {}".format(
+            record.direction, ", ".join(DIRECTIONS)))
+    if not inside(record.position.get("x"), record.position.get("y"),
+                  *PLAYER):
+        errors.append("start position {} is off the arena".format(
+            record.position))
+    for kind, entities in (("boulder", record.mv_boulders),
+                           ("wall", record.walls),
+                           ("monster", record.monsters),
+                           ("door", record.doors)):
+        for entity in entities:
+            if not inside(entity.get("x"), entity.get("y"), TILE, TILE):
+                errors.append("{} at {}, {} is off the arena".format(
+                    kind, entity.get("x"), entity.get("y")))
+                return result
+    for door in record.doors:
+        gate = door["gate"]
+        if not inside(gate["x"], gate["y"], *PLAYER):
+            errors.append("door at {}, {} lets the player in at {}, {}, "
+                          "off the arena".format(door["x"], door["y"],
+                                                 gate["x"], gate["y"]))
+    boulders = record.mv_boulders
+    for i, boulder in enumerate(boulders):
+        for other in boulders[i + 1:]:
+            if overlaps(boulder, other):
+                warnings.append("boulders at {}, {} and {}, {} overlap".format(
+                    boulder["x"], boulder["y"], other["x"], other["y"]))
+        for wall in record.walls:
+            if overlaps(boulder, wall):
+                warnings.append("boulder at {}, {} overlaps the wall at "
+                                "{}, {}".format(boulder["x"], boulder["y"],
+                                                wall["x"], wall["y"]))
+    result["doors"] = [(door["x"], door["y"], door["gate"]["scene_name"])
+                       for door in record.doors]
+    result["payload"] = marshal.dumps(normalise(record))
+    return result
+
+
+def check_doors(results):
+    # Every gate must lead to a room that exists, and that room should have
+    # a door back
+    rooms = {room_key(r["name"]): r for r in results}
+    for result in results:
+        for x, y, target in result.get("doors", []):
+            if room_key(target) not in rooms:
+                result["errors"].append(
+                    "door at {}, {} leads to {!r}, which has no scene "
+                    "file".format(x, y, target))
+                continue
+            back = rooms[room_key(target)].get("doors", [])
+            if not any(room_key(gate) == room_key(result["name"])
+                       for bx, by, gate in back):
+                result["warnings"].append(
+                    "door at {}, {} leads to {} with no door back".format(
+                        x, y, target))
+
+
+def compile_scenes(scenes_dir="scenes", pack_path=PACK_PATH, workers=None,
+                   strict=False, report=print):
+    paths = sorted(glob.glob(os.path.join(scenes_dir, "*.yaml")))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(check_scene, paths, chunksize=4))
+    check_doors(results)
+    failed = False
+    for result in results:
+        problems = [("error", e) for e in result["errors"]]
+        problems += [("warning", w) for w in result["warnings"]]
+        for level, text in problems:
+            report("{}: {}: {}".format(result["name"], level, text))
+        if result["errors"] or (strict and result["warnings"]):
+            failed = True
+    if failed:
+        return None
+    rooms = [(r["name"], r["source"], r["payload"]) for r in results]
+    return write_pack(rooms, pack_path, VALIDATED)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate scenes/ and compile it into a world pack")
+    parser.add_argument("--scenes", default="scenes")
+    parser.add_argument("--output", default=PACK_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--strict", action="store_true",
+                        help="treat warnings as errors too")
+    args = parser.parse_args()
+    count = compile_scenes(args.scenes, args.output, args.workers,
+                           args.strict)
+    if count is None:
+        print("Scenes have errors, {} was not written".format(args.output))
+        sys.exit(1)
+    print("Compiled {} scenes into {}".format(count, args.output))
+
+
+if __name__ == "__main__":
+    main()
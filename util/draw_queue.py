@@ -0,0 +1,169 @@
+from collections import Counter
+from util.grid import HEIGHT, WIDTH
+
+# Layers, drawn from the lowest up. Within a layer sprites keep the order
+# they were queued in.
+BOULDERS = 0
+MONSTERS = 1
+PLAYER = 2
+FIREBALL = 3
+TEXTS = 4
+HUD = 5
+LAYERS = 6
+# Pyxel's font, for the rectangle a text covers
+FONT_WIDTH = 4
+FONT_HEIGHT = 6
+
+
+def covered(covers, x, y, w, h):
+    for x0, y0, x1, y1 in covers:
+        if x0 <= x and y0 <= y and x + w <= x1 and y + h <= y1:
+            return True
+    return False
+
+
+def bounds(item):
+    # (x0, y0, x1, y1) of a queued sprite or text, clipped to the screen
+    sprite, x, y = item[0], item[1], item[2]
+    if sprite is None:
+        w, h = FONT_WIDTH * len(item[3]), FONT_HEIGHT
+    else:
+        w, h = sprite.w, sprite.h
+    return (max(x, 0), max(y, 0), min(x + w, WIDTH), min(y + h, HEIGHT))
+
+
+def overlaps(rects, x0, y0, x1, y1):
+    for left, top, right, bottom in rects:
+        if x0 < right and left < x1 and y0 < bottom and top < y1:
+            return True
+    return False
+
+
+def merge(rects):
+    # Join rectangles whose union costs no more to redraw than both apart,
+    # such as the old and new spot of a sprite that moved a pixel
+    merged = []
+    for x0, y0, x1, y1 in sorted(rects):
+        size = (x1 - x0) * (y1 - y0)
+        for i, (left, top, right, bottom) in enumerate(merged):
+            union = (min(x0, left), min(y0, top),
+                     max(x1, right), max(y1, bottom))
+            if ((union[2] - union[0]) * (union[3] - union[1]) <=
+                    size + (right - left) * (bottom - top)):
+                merged[i] = union
+                break
+        else:
+            merged.append((x0, y0, x1, y1))
+    return merged
+
+
+class DrawQueue:
+    # Collects a frame's sprites and texts, then draws them in one pass:
+    # layer by layer, leaving out anything off the screen or hidden under
+    # an opaque sprite drawn later.
+    #
+    # Given the background to draw under them, restore() only repaints the
+    # rectangles where something changed since the last frame, and flush()
+    # only the sprites that touch them. The rest of the screen still holds
+    # last frame's picture; invalidate() when anything else drew over it.
+    def __init__(self, background=None, layers=LAYERS):
+        self.layers = [[] for layer in range(0, layers)]
+        self.background = background
+        self.opaque = 0
+        self.culled = 0
+        self.shown = []
+        self.drawn = Counter()
+        self.full = True
+        self.pending = None
+
+    def add(self, layer, sprite, x, y):
+        if (x >= WIDTH or y >= HEIGHT or
+                x + sprite.w <= 0 or y + sprite.h <= 0):
+            self.culled += 1
+            return
+        self.opaque += sprite.opaque
+        self.layers[layer].append((sprite, x, y))
+
+    def text(self, layer, x, y, s, col):
+        self.layers[layer].append((None, x, y, s, col))
+
+    def visible(self):
+        # Walk back from the top, remembering the opaque rectangles seen.
+        # Without any opaque sprite queued nothing can be hidden.
+        shown = [item for layer in self.layers for item in layer]
+        for layer in self.layers:
+            layer.clear()
+        if not self.opaque:
+            return shown
+        self.opaque = 0
+        covers = []
+        kept = []
+        # Box around every cover so far: most sprites fall outside it
+        left = top = WIDTH + HEIGHT
+        right = bottom = -left
+        for item in reversed(shown):
+            sprite = item[0]
+            if sprite is not None:
+                x, y = item[1], item[2]
+                if (left <= x and top <= y and
+                        x + sprite.w <= right and y + sprite.h <= bottom and
+                        covered(covers, x, y, sprite.w, sprite.h)):
+                    self.culled += 1
+                    continue
+                if sprite.opaque:
+                    covers.append((x, y, x + sprite.w, y + sprite.h))
+                    left, top = min(left, x), min(top, y)
+                    right = max(right, x + sprite.w)
+                    bottom = max(bottom, y + sprite.h)
+            kept.append(item)
+        kept.reverse()
+        return kept
+
+    def invalidate(self):
+        self.full = True
+
+    def restore(self, pyxel):
+        # Repaint the background where the frame differs from the last one
+        # and pick what has to be drawn again on top of it
+        shown = self.visible()
+        self.pending = shown
+        if self.background is None:
+            return
+        if not self.full and shown == self.shown:
+            # Nothing moved: last frame's picture is still right
+            self.pending = []
+            return
+        self.shown = shown
+        now = Counter(shown)
+        if self.full:
+            self.background(pyxel)
+            self.full = False
+        else:
+            changed = (self.drawn - now) + (now - self.drawn)
+            dirty = merge([bounds(item) for item in changed])
+            for x0, y0, x1, y1 in dirty:
+                if x0 < x1 and y0 < y1:
+                    self.background(pyxel, x0, y0, x1 - x0, y1 - y0)
+            # Anything drawn again covers whatever overlaps it later in the
+            # order, so that has to be drawn again too
+            self.pending = []
+            for item in shown:
+                rect = bounds(item)
+                if overlaps(dirty, *rect):
+                    self.pending.append(item)
+                    dirty.append(rect)
+        self.drawn = now
+
+    def flush(self, pyxel):
+        blt = pyxel.blt
+        text = pyxel.text
+        if self.pending is None:
+            self.restore(pyxel)
+        items, self.pending = self.pending, None
+        for item in items:
+            sprite = item[0]
+            if sprite is None:
+                text(*item[1:])
+            else:
+                blt(item[1], item[2], sprite.image, sprite.u, sprite.v,
+                    sprite.w, sprite.h, sprite.colkey)
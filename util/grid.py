@@ -0,0 +1,131 @@
+import numpy as np
+from util.atlas import BOULDER, DOORS, STONE, WALL
+from util.atlas import sprite, stamp
+from util.spatial import SpatialHash
+
+WIDTH = 160
+HEIGHT = 120
+# Probes read a pixel past whatever they surround, so the layers carry a
+# margin around the arena instead of bounds checking every lookup.
+PAD = 16
+ORIGIN = (-PAD, -PAD)
+
+
+def border_tiles():
+    # The stones App.draw_scene lays around the playable arena
+    tiles = []
+    for i in range(1, 15):
+        tiles.append((0, i*8))
+        tiles.append((152, i*8))
+    for i in range(1, 20):
+        tiles.append((i*8, 8))
+        tiles.append((i*8, 112))
+    return tiles
+
+
+def solid_tiles(walls, doors):
+    # Corners of the 8x8 tiles nothing can move through: border stones,
+    # walls and doors
+    return (border_tiles() + [(w["x"], w["y"]) for w in walls] +
+            [(d["x"], d["y"]) for d in doors])
+
+
+class SceneGrid:
+    # Logical copy of what the scene paints for collisions: the same palette
+    # colours the frame would hold (13 border and boulders, 2 walls, 9 and 4
+    # doors) without reading anything back from the screen.
+    def __init__(self, atlas, walls, doors, room):
+        shape = (HEIGHT + 2*PAD, WIDTH + 2*PAD)
+        self.boulder = sprite(atlas, BOULDER)
+        self.room = room
+        self.boulder_index = SpatialHash()
+        for i, (x, y) in enumerate(room.boulders()):
+            self.boulder_index.insert(i, x, y)
+        self.solid_index = SpatialHash()
+        for i, (x, y) in enumerate(solid_tiles(walls, doors)):
+            self.solid_index.insert(i, x, y)
+
+        self.border = np.zeros(shape, dtype=np.uint8)
+        stone = sprite(atlas, STONE)
+        for x, y in border_tiles():
+            stamp(self.border, ORIGIN, *stone, x, y)
+
+        # Walls and doors are drawn on top of the boulders
+        self.overlay = np.zeros(shape, dtype=np.uint8)
+        self.overlay_mask = np.zeros(shape, dtype=bool)
+        wall = sprite(atlas, WALL)
+        for info in walls:
+            self.add_overlay(wall, info["x"], info["y"])
+        for info in doors:
+            door = sprite(atlas, DOORS[info["door_type"]])
+            self.add_overlay(door, info["x"], info["y"])
+
+        self.cells = np.zeros(shape, dtype=np.uint8)
+        self.refresh(-PAD, -PAD, WIDTH + PAD, HEIGHT + PAD)
+
+    def add_overlay(self, image, x, y):
+        pixels, mask = image
+        stamp(self.overlay, ORIGIN, pixels, mask, x, y)
+        stamp(self.overlay_mask, ORIGIN, mask, mask, x, y)
+
+    def refresh(self, x0, y0, x1, y1):
+        # Recompose one rectangle: border, boulders, then walls and doors
+        x0, y0 = max(x0, -PAD), max(y0, -PAD)
+        x1, y1 = min(x1, WIDTH + PAD), min(y1, HEIGHT + PAD)
+        window = np.s_[y0 + PAD:y1 + PAD, x0 + PAD:x1 + PAD]
+        region = self.border[window].copy()
+        # Only the boulders reaching into the rectangle, in scene order
+        for i in sorted(self.boulder_index.in_rect(x0 - 7, y0 - 7, x1, y1)):
+            x, y = self.boulder_index.positions[i]
+            stamp(region, (x0, y0), *self.boulder, x, y)
+        mask = self.overlay_mask[window]
+        region[mask] = self.overlay[window][mask]
+        self.cells[window] = region
+
+    def move_boulders(self, boulder_ids, dx, dy):
+        # Move boulders together by the same step. Only the pixels under
+        # their old and new spots change, recomposed once.
+        corners = []
+        for i in boulder_ids:
+            old_x = int(self.room.boulder_x[i])
+            old_y = int(self.room.boulder_y[i])
+            self.room.move_boulder(i, dx, dy)
+            self.boulder_index.move(i, old_x + dx, old_y + dy)
+            corners += [(old_x, old_y), (old_x + dx, old_y + dy)]
+        if corners:
+            self.refresh(min(x for x, y in corners),
+                         min(y for x, y in corners),
+                         max(x for x, y in corners) + 8,
+                         max(y for x, y in corners) + 8)
+
+    def hline(self, x0, x1, y, layer=None):
+        if layer is None:
+            layer = self.cells
+        if self.inside(layer, x0, y) and self.inside(layer, x1 - 1, y):
+            return layer[y + PAD, x0 + PAD:x1 + PAD].tolist()
+        return [self.pixel(layer, x, y) for x in range(x0, x1)]
+
+    def vline(self, x, y0, y1, layer=None):
+        if layer is None:
+            layer = self.cells
+        if self.inside(layer, x, y0) and self.inside(layer, x, y1 - 1):
+            return layer[y0 + PAD:y1 + PAD, x + PAD].tolist()
+        return [self.pixel(layer, x, y) for y in range(y0, y1)]
+
+    def area(self, x0, y0, x1, y1, layer=None):
+        # A view of a rectangle of the layer, or None if it runs off the edge
+        if layer is None:
+            layer = self.cells
+        if self.inside(layer, x0, y0) and self.inside(layer, x1 - 1, y1 - 1):
+            return layer[y0 + PAD:y1 + PAD, x0 + PAD:x1 + PAD]
+        return None
+
+    def inside(self, layer, x, y):
+        return (0 <= y + PAD < layer.shape[0] and
+                0 <= x + PAD < layer.shape[1])
+
+    def pixel(self, layer, x, y):
+        # Like pget, anything off the edge reads as colour 0
+        if self.inside(layer, x, y):
+            return int(layer[y + PAD, x + PAD])
+        return 0
@@ -0,0 +1,104 @@
+class HeadlessImage:
+    def __init__(self):
+        self.rows = dict()
+
+    def set(self, x, y, data):
+        if isinstance(data, int):
+            data = ["{:x}".format(data)]
+        for i, row in enumerate(data):
+            self.rows[y + i] = row
+
+    def get(self, x, y):
+        row = self.rows.get(y, "")
+        return int(row[x], 16) if x < len(row) else 0
+
+
+class HeadlessPyxel:
+    # Stands in for the pyxel module so App can run without a window. Input
+    # comes from step(), and drawing calls are only counted.
+    KEY_Q = "KEY_Q"
+    KEY_R = "KEY_R"
+    KEY_F = "KEY_F"
+    KEY_I = "KEY_I"
+    KEY_P = "KEY_P"
+    KEY_RIGHT = "KEY_RIGHT"
+    KEY_LEFT = "KEY_LEFT"
+    KEY_UP = "KEY_UP"
+    KEY_DOWN = "KEY_DOWN"
+    KEY_LEFT_SHIFT = "KEY_LEFT_SHIFT"
+
+    def __init__(self):
+        self.frame_count = 0
+        self.held = dict()
+        self.images = dict()
+        self.calls = dict()
+        self.running = True
+        self.update = None
+        self.draw = None
+
+    def init(self, width, height, **kwargs):
+        self.width = width
+        self.height = height
+
+    def load(self, filename, *args, **kwargs):
+        pass
+
+    def run(self, update, draw):
+        # The caller drives the frames with step() instead of a main loop
+        self.update = update
+        self.draw = draw
+
+    def quit(self):
+        self.running = False
+
+    def step(self, keys=()):
+        # One frame with exactly these keys held down
+        for key in list(self.held):
+            if key not in keys:
+                del self.held[key]
+        for key in keys:
+            self.held.setdefault(key, self.frame_count)
+        self.update()
+        self.draw()
+        self.frame_count += 1
+
+    def btn(self, key):
+        return key in self.held
+
+    def btnp(self, key, hold=0, period=0):
+        # Same repeat rule as Pyxel: the first frame of a press, then every
+        # period frames once the key has been held for hold frames.
+        if key not in self.held:
+            return False
+        frames = self.frame_count - self.held[key]
+        if frames == 0:
+            return True
+        return (hold > 0 and period > 0 and frames >= hold and
+                (frames - hold) % period == 0)
+
+    def count(self, call, n=1):
+        self.calls[call] = self.calls.get(call, 0) + n
+
+    def image(self, img, system=False):
+        return self.images.setdefault(img, HeadlessImage())
+
+    def cls(self, col):
+        self.count("cls")
+
+    def blt(self, x, y, img, u, v, w, h, colkey=-1):
+        self.count("blt")
+        self.count("blt_pixels", w * h)
+
+    def bltm(self, x, y, tm, u, v, w, h, colkey=-1):
+        self.count("bltm")
+        self.count("blt_pixels", w * h)
+
+    def rect(self, x, y, w, h, col):
+        self.count("rect")
+
+    def text(self, x, y, s, col):
+        self.count("text")
+
+    def pget(self, x, y):
+        self.count("pget")
+        return 0
@@ -1,56 +1,152 @@
-import yaml
-
-
-def load_yaml(scene):
-    with open("scenes/{}.yaml".format(scene), 'r') as f:
-        data = yaml.safe_load(f)
-    return data
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from util.atlas import DOORS, GROUNDS
+from util.world_pack import read_room
+
+# Number of parsed scenes kept around before the least recently used is
+# dropped. The player only ever bounces between a handful of rooms.
+CACHE_SIZE = 16
+
+# validated: the record comes from a compiled pack and needs no checking
+Scene = namedtuple("Scene", ["name", "position", "direction", "mv_boulders",
+                             "walls", "texts", "doors", "ground",
+                             "ground_map", "monsters", "validated"],
+                   defaults=(False,))
+
+_cache = OrderedDict()
+# Rooms are also loaded from the prefetch threads
+_lock = threading.Lock()
+
+
+def scene_path(scene):
+    return "scenes/{}.yaml".format(scene)
+
+
+def parse_scene(scene, data, validated=False):
+    if validated:
+        # util.compile_scenes already filled in every field
+        return Scene(scene, data['position'], data['direction'],
+                     data['mv_boulders'], data['walls'], data['texts'],
+                     data['door_info'], data['ground'], data['ground_map'],
+                     data['monsters'], True)
+    # Empty scene files load as None, so every field falls back to a default
+    if not isinstance(data, dict):
+        data = {}
+    return Scene(name=scene,
+                 position=data.get('position', {"x": 50, "y": 50}),
+                 direction=data.get('direction', "left"),
+                 mv_boulders=data.get('mv_boulders', []),
+                 walls=data.get('walls', []),
+                 texts=data.get('texts', []),
+                 doors=data.get('door_info', []),
+                 ground=data.get('ground', None),
+                 ground_map=data.get('ground_map', None),
+                 monsters=data.get('monsters', []))
+
+
+def load_scene(scene, pack=None):
+    # Parse each scene file once and hand back the cached record until the
+    # file changes on disk.
+    mtime = os.stat(scene_path(scene)).st_mtime_ns
+    with _lock:
+        cached = _cache.get(scene)
+        if cached is not None and cached[0] == mtime:
+            _cache.move_to_end(scene)
+            return cached[1]
+    record = parse_scene(scene, *read_room(scene, pack))
+    with _lock:
+        _cache[scene] = (mtime, record)
+        _cache.move_to_end(scene)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return record
+
+
+def validate(record):
+    # Door mistakes otherwise only show up when the player walks into them
+    if record.validated:
+        return record
+    # Shapes first, so the checks below and the game can take them on trust
+    if not isinstance(record.position, dict):
+        raise ValueError("{}: position {!r} is not a mapping of x and "
+                         "y".format(record.name, record.position))
+    for key, entities in (("mv_boulders", record.mv_boulders),
+                          ("walls", record.walls),
+                          ("texts", record.texts),
+                          ("door_info", record.doors),
+                          ("monsters", record.monsters)):
+        if not isinstance(entities, list):
+            raise ValueError("{}: {} is {!r}, not a list".format(
+                record.name, key, entities))
+        for entity in entities:
+            if not isinstance(entity, dict):
+                raise ValueError("{}: {} holds {!r}, not a mapping".format(
+                    record.name, key, entity))
+    for door in record.doors:
+        if not isinstance(door.get("gate", {}), dict):
+            raise ValueError("{}: door at {}, {} has gate {!r}, not a "
+                             "mapping".format(record.name, door.get("x"),
+                                              door.get("y"), door["gate"]))
+        if door.get("door_type") not in DOORS:
+            raise ValueError("{}: unknown door type {!r}".format(
+                record.name, door.get("door_type")))
+        gate = door.get("gate") or {}
+        for key in ("scene_name", "x", "y"):
+            if key not in gate:
+                raise ValueError("{}: door at {}, {} has no gate {}".format(
+                    record.name, door.get("x"), door.get("y"), key))
+    if record.ground_map is not None:
+        if not isinstance(record.ground_map, dict):
+            raise ValueError("{}: ground_map {!r} is not a mapping".format(
+                record.name, record.ground_map))
+        legend = record.ground_map.get("legend", {})
+        if not isinstance(legend, dict):
+            raise ValueError("{}: ground map legend {!r} is not a "
+                             "mapping".format(record.name, legend))
+        rows = record.ground_map.get("rows", [])
+        if (not isinstance(rows, list) or
+                not all(isinstance(row, str) for row in rows)):
+            raise ValueError("{}: ground map rows {!r} are not a list of "
+                             "strings".format(record.name, rows))
+        for char, tile in legend.items():
+            if isinstance(tile, str):
+                if tile not in GROUNDS:
+                    raise ValueError("{}: ground map {!r} is {!r}, not a "
+                                     "ground type".format(
+                                         record.name, char, tile))
+            elif (not isinstance(tile, list) or len(tile) != 2 or
+                    not all(isinstance(c, int) and 0 <= c <= 248
+                            for c in tile)):
+                raise ValueError("{}: ground map {!r} is {!r}, not a "
+                                 "tile's [u, v]".format(
+                                     record.name, char, tile))
+    return record
 
 
 def position(scene):
-    try:
-        return load_yaml(scene).get('position', {"x": 50, "y": 50})
-    except AttributeError:
-        return {"x": 50, "y": 50}
+    return load_scene(scene).position
 
 
 def direction(scene):
-    try:
-        return load_yaml(scene).get('direction', "left")
-    except AttributeError:
-        return "left"
+    return load_scene(scene).direction
 
 
 def mv_boulders(scene):
-    try:
-        return load_yaml(scene).get('mv_boulders', [])
-    except AttributeError:
-        return []
+    return load_scene(scene).mv_boulders
 
 
 def walls(scene):
-    try:
-        return load_yaml(scene).get('walls', [])
-    except AttributeError:
-        return []
+    return load_scene(scene).walls
 
 
 def scene_texts(scene):
-    try:
-        return load_yaml(scene).get('texts', [])
-    except AttributeError:
-        return []
+    return load_scene(scene).texts
 
 
 def doors(scene):
-    try:
-        return load_yaml(scene).get('door_info', [])
-    except AttributeError:
-        return []
+    return load_scene(scene).doors
 
 
 def ground(scene):
-    try:
-        return load_yaml(scene).get('ground', None)
-    except AttributeError:
-        return None
+    return load_scene(scene).ground
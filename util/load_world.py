@@ -1,31 +1,17 @@
-import yaml
-import glob
-import os
+from functools import partial
+from util.world_pack import load_room
+from util.world_state import RESIDENT_ROOMS, WorldState
 
 
-def load_yaml(scene):
-    with open(scene, 'r') as f:
-        data = yaml.safe_load(f)
-    return data
+def room_entities(name, pack=None):
+    # Boulders and monsters of one room, as its scene file starts them
+    data = load_room(name, pack)
+    if not isinstance(data, dict):
+        data = {}
+    return data.get('mv_boulders', []), data.get('monsters', [])
 
 
-def get_all_from_key(top_level_key):
-    scenes = glob.glob("scenes/*.yaml")
-    all_scenes = dict()
-    for scene in scenes:
-        formatted_scene = os.path.basename(scene).replace('.yaml', '')
-        if formatted_scene != "a1":
-            try:
-                all_scenes[formatted_scene] = load_yaml(
-                    scene).get(top_level_key, [])
-            except AttributeError:
-                all_scenes[formatted_scene] = {"default": ""}
-    return all_scenes
-
-
-def all_boulders():
-    return get_all_from_key('mv_boulders')
-
-
-def all_monsters():
-    return get_all_from_key('monsters')
+def load_world(pack=None, resident=RESIDENT_ROOMS):
+    # Rooms are only read when the player gets near them, so startup does
+    # not depend on how big the world is
+    return WorldState(partial(room_entities, pack=pack), resident)
@@ -0,0 +1,113 @@
+import numpy as np
+from util.grid import PAD
+from util.spatial import SpatialHash
+
+# A monster steps in each direction on one frame in this many
+STEP_CHANCE = 6
+# Order the steps are tried in: down, right, up, left. The last value is
+# the side of the tile bubble (north, south, east, west) that must be free.
+STEPS = ((0, 1, 1), (1, 0, 2), (0, -1, 0), (-1, 0, 3))
+
+
+def window_sum(cells, axis):
+    # Count of set cells in every 8 pixel run starting at each index
+    total = np.cumsum(cells, axis=axis, dtype=np.int32)
+    total = np.concatenate(
+        [np.zeros_like(total.take([0], axis=axis)), total], axis=axis)
+    if axis == 1:
+        return total[:, 8:] - total[:, :-8]
+    return total[8:] - total[:-8]
+
+
+def shifted(source, dy, dx, shape):
+    # out[y, x] = source[y + dy, x + dx], False where that falls outside
+    out = np.zeros(shape, dtype=bool)
+    height, width = source.shape
+    y0, y1 = max(0, -dy), min(shape[0], height - dy)
+    x0, x1 = max(0, -dx), min(shape[1], width - dx)
+    out[y0:y1, x0:x1] = source[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+    return out
+
+
+def border_blocks(layer, color=13):
+    # For each tile position (padded coordinates), whether each side of its
+    # tile bubble touches the given colour: the 8 pixels just above, below,
+    # right of and left of the tile, one pixel in from its corner.
+    cells = layer == color
+    rows = window_sum(cells, 1) > 0
+    columns = window_sum(cells, 0) > 0
+    return (shifted(rows, -1, 1, layer.shape),
+            shifted(rows, 8, 1, layer.shape),
+            shifted(columns, 1, 9, layer.shape),
+            shifted(columns, 1, -1, layer.shape))
+
+
+class MonsterGroup:
+    # Working copy of one room's monsters. The room in the world state
+    # gets positions and dead flags back on store(). With a flow field,
+    # monsters near the player chase it instead of wandering.
+    def __init__(self, room, border, field=None):
+        self.room = room
+        self.field = field
+        self.x = room.monster_x.astype(np.int32)
+        self.y = room.monster_y.astype(np.int32)
+        self.alive = room.monster_alive.copy()
+        self.types = room.monster_types
+        self.blocks = border_blocks(border)
+        self.index = SpatialHash()
+        for i in self.living():
+            self.index.insert(i, self.x[i], self.y[i])
+
+    def step(self, position, random):
+        # Random walk every monster at once, or chase the player, and
+        # return how many steps ended on the player.
+        count = len(self.x)
+        rolls = random.rolls(STEP_CHANCE, (4, count)) == 0
+        chasing = np.zeros(count, dtype=bool)
+        if self.field is not None:
+            self.field.update(self.room, position)
+            chasing, chase_x, chase_y = self.field.chase(self.x, self.y,
+                                                         position)
+        rows = np.clip(self.y + PAD, 0, self.blocks[0].shape[0] - 1)
+        columns = np.clip(self.x + PAD, 0, self.blocks[0].shape[1] - 1)
+        free = [~blocked[rows, columns] for blocked in self.blocks]
+        size = self.index.cell_size
+        cells = (self.x // size, self.y // size)
+        hits = 0
+        for roll, (dx, dy, side) in zip(rolls, STEPS):
+            move = roll & free[side] & self.alive & ~chasing
+            self.x += dx * move
+            self.y += dy * move
+            hits += np.count_nonzero(move & self.touching(position))
+        # A chasing monster takes one step on a tick any of its rolls came
+        # up, and waits once it has caught the player
+        move = (chasing & rolls.any(axis=0) & self.alive &
+                ~self.touching(position))
+        if move.any():
+            self.x += chase_x * move
+            self.y += chase_y * move
+            hits += np.count_nonzero(move & self.touching(position))
+        # Only monsters that crossed into another cell touch the index
+        crossed = ((self.x // size != cells[0]) |
+                   (self.y // size != cells[1]))
+        for i in np.flatnonzero(crossed):
+            self.index.move(i, self.x[i], self.y[i])
+        return int(hits)
+
+    def touching(self, position):
+        # A monster hurts when its corner is inside the player's 6x7 sprite
+        return ((self.x >= position["x"]) & (self.x < position["x"] + 6) &
+                (self.y >= position["y"]) & (self.y < position["y"] + 7))
+
+    def living(self):
+        return np.flatnonzero(self.alive)
+
+    def closest(self, x, y):
+        return self.index.nearest(x, y)
+
+    def kill(self, i):
+        self.alive[i] = False
+        self.index.remove(i)
+
+    def store(self):
+        self.room.store_monsters(self.x, self.y, self.alive)
@@ -1,90 +1,74 @@
-import numpy as np
+# Boulders are 8x8 boxes, as are the stones, walls and doors they stop at
+SIZE = 8
+# Strip just past each side of a boulder, as (x, y, width, height) relative
+# to it, for each direction it moves, and the step it takes
+BOULDER_EDGES = {"up": ((0, -1, 8, 1), (0, -1)),
+                 "down": ((0, 8, 8, 1), (0, 1)),
+                 "left": ((-1, 0, 1, 8), (-1, 0)),
+                 "right": ((8, 0, 1, 8), (1, 0))}
+# The same strips around the player's 6x7 sprite, as its bubble reads them
+PLAYER_EDGES = {"up": (0, -1, 6, 1),
+                "down": (0, 7, 6, 1),
+                "left": (-1, 0, 1, 7),
+                "right": (6, 0, 1, 7)}
+OPPOSITE = {"up": "down", "down": "up", "left": "right", "right": "left"}
 
 
-def closest_point(origin, boulder_coords):
-    if len(boulder_coords) != 0:
-        boulder_coords = np.asarray(boulder_coords)
-        boulder_dist = np.sum((boulder_coords - origin)**2, axis=1)
-        return np.argmin(boulder_dist)
+def touching(index, x, y, width, height):
+    # Keys of the boxes in a spatial index that overlap the rectangle
+    return index.in_rect(x - SIZE + 1, y - SIZE + 1, x + width, y + height)
 
 
-def detect_movable_boulder(pyxel, color_bar, direction,
-                           position, mv_boulders):
-    # Decide which boulder is moving
-    boulder_coords = [(x["x"], x["y"]) for x in mv_boulders]
-    character_coords = (position["x"], position["y"])
-    boulder_id = closest_point(character_coords, boulder_coords)
-    if direction == "up":
-        if (
-                color_bar != [13, 13, 13, 13, 13, 13] and
-                9 not in color_bar
-        ):
-            collision_detect = []
-            for i in range(0, 6):
-                collision_detect.append(
-                    pyxel.pget(mv_boulders[boulder_id]["x"] + i,
-                               mv_boulders[boulder_id]["y"] - 1))
-            if (13 in collision_detect or 2 in collision_detect):
-                return True
-            else:
-                mv_boulders[boulder_id] = {
-                    "x": mv_boulders[boulder_id]["x"],
-                    "y": mv_boulders[boulder_id]["y"] - 1
-                    }
-                return False
+def in_front(grid, i, direction):
+    # Whether boulder i is up against a stone, wall or door, and the
+    # boulders it is up against, on the side it moves towards
+    (x, y, width, height), step = BOULDER_EDGES[direction]
+    bx, by = grid.boulder_index.positions[i]
+    return (bool(touching(grid.solid_index, bx + x, by + y, width, height)),
+            touching(grid.boulder_index, bx + x, by + y, width, height))
 
-    if direction == "down":
-        if (
-                color_bar != [13, 13, 13, 13, 13, 13] and
-                9 not in color_bar
-        ):
-            collision_detect = []
-            for i in range(0, 7):
-                collision_detect.append(
-                    pyxel.pget(mv_boulders[boulder_id]["x"] + i,
-                               mv_boulders[boulder_id]["y"] + 8))
-            if (13 in collision_detect or 2 in collision_detect):
-                return True
-            mv_boulders[boulder_id] = {
-                "x": mv_boulders[boulder_id]["x"],
-                "y": mv_boulders[boulder_id]["y"] + 1
-                }
-            return False
 
-    if direction == "left":
-        if (
-                color_bar != [13, 13, 13, 13, 13, 13, 13] and
-                9 not in color_bar
-        ):
-            collision_detect = []
-            for i in range(0, 7):
-                collision_detect.append(
-                    pyxel.pget(mv_boulders[boulder_id]["x"] - 1,
-                               mv_boulders[boulder_id]["y"] + i))
-            if (13 in collision_detect or 2 in collision_detect):
-                return True
-            mv_boulders[boulder_id] = {
-                "x": mv_boulders[boulder_id]["x"] - 1,
-                "y": mv_boulders[boulder_id]["y"]
-                }
-            return False
+def boulder_chain(grid, seeds, direction):
+    # Every boulder that has to move for the seeds to move one step: the
+    # seeds and, in turn, whatever is in front of each boulder moving. None
+    # if any of them would run into a stone, wall or door. The answer does
+    # not depend on the order contacts are found in, so pushing into
+    # several boulders at once always comes out the same.
+    moving = set(seeds)
+    frontier = sorted(moving)
+    while frontier:
+        solid, boulders = in_front(grid, frontier.pop(), direction)
+        if solid:
+            return None
+        for other in boulders:
+            if other not in moving:
+                moving.add(other)
+                frontier.append(other)
+    return sorted(moving)
 
-    if direction == "right":
-        if (
-                color_bar != [13, 13, 13, 13, 13, 13, 13] and
-                9 not in color_bar
-        ):
-            collision_detect = []
-            for i in range(0, 7):
-                collision_detect.append(
-                    pyxel.pget(mv_boulders[boulder_id]["x"] + 8,
-                               mv_boulders[boulder_id]["y"] + i))
-            if (13 in collision_detect or 2 in collision_detect):
-                return True
-            mv_boulders[boulder_id] = {
-                "x": mv_boulders[boulder_id]["x"] + 1,
-                "y": mv_boulders[boulder_id]["y"]
-                }
-            return False
 
-    return True
+def detect_movable_boulder(grid, direction, position, pulling=False):
+    # Move the boulders the player pushes, or pulls from behind, one step
+    # in direction. Returns True when they cannot move.
+    side = OPPOSITE[direction] if pulling else direction
+    x, y, width, height = PLAYER_EDGES[side]
+    x, y = position["x"] + x, position["y"] + y
+    if touching(grid.solid_index, x, y, width, height):
+        return True
+    seeds = touching(grid.boulder_index, x, y, width, height)
+    if not seeds:
+        return True
+    if pulling:
+        # Only what is right behind the player comes along, and nothing
+        # moves if any of it would run into something else
+        chain = sorted(seeds)
+        for i in chain:
+            solid, boulders = in_front(grid, i, direction)
+            if solid or set(boulders) - set(chain):
+                return True
+    else:
+        chain = boulder_chain(grid, seeds, direction)
+        if chain is None:
+            return True
+    grid.move_boulders(chain, *BOULDER_EDGES[direction][1])
+    return False
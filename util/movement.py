@@ -0,0 +1,72 @@
+from util.collision import collision_detect, detect_door
+from util.collision import get_character_bubble
+from util.movable import detect_movable_boulder
+from util.profiler import NullProfiler
+
+# Keys are handled in this order every tick. Holding two of them moves
+# the player diagonally, one axis after the other.
+DIRECTIONS = (("right", "KEY_RIGHT"),
+              ("left", "KEY_LEFT"),
+              ("up", "KEY_UP"),
+              ("down", "KEY_DOWN"))
+# Unit step for each direction and the character bubble sides (north,
+# south, east, west) in front of and behind the player
+MOVES = {"right": (1, 0, 2, 3),
+         "left": (-1, 0, 3, 2),
+         "up": (0, -1, 0, 1),
+         "down": (0, 1, 1, 0)}
+# Pixels the player covers per tick while a direction key is held
+PLAYER_SPEED = 1
+
+
+def swept_area(grid, position, direction, distance):
+    # The pixels the front of the player's sprite would cross
+    x, y = position["x"], position["y"]
+    dx, dy = MOVES[direction][:2]
+    if dx:
+        x0 = x + 6 if dx > 0 else x - distance
+        return grid.area(x0, y, x0 + distance, y + 7)
+    y0 = y + 7 if dy > 0 else y - distance
+    return grid.area(x, y0, x + 6, y0 + distance)
+
+
+def can_pull(edge):
+    return 13 in edge and 9 not in edge and edge != [13] * len(edge)
+
+
+def move_player(grid, position, direction, distance, door_index,
+                pulling=False, profiler=None):
+    # Walk the player up to distance pixels, pushing boulders in front and
+    # pulling the one behind when asked. Returns the index of the door
+    # walked into, or None.
+    profiler = profiler or NullProfiler()
+    dx, dy, front, back = MOVES[direction]
+    bubble = get_character_bubble(grid, position)
+
+    # Nothing within reach: a single slice covers the whole distance
+    area = swept_area(grid, position, direction, distance)
+    if (area is not None and not area.any() and
+            not (pulling and can_pull(bubble[back]))):
+        position["x"] += dx * distance
+        position["y"] += dy * distance
+        return None
+
+    for step in range(0, distance):
+        if step:
+            bubble = get_character_bubble(grid, position)
+        with profiler.section("door"):
+            door_is_there, door_id = detect_door(
+                grid, position, direction, door_index, bubble)
+        if door_is_there:
+            return door_id
+        if pulling and can_pull(bubble[back]):
+            with profiler.section("pull"):
+                detect_movable_boulder(grid, direction, position,
+                                       pulling=True)
+        with profiler.section("collision"):
+            blocked = collision_detect(grid, position, direction, bubble)
+        if blocked:
+            return None
+        position["x"] += dx
+        position["y"] += dy
+    return None
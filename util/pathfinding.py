@@ -0,0 +1,101 @@
+from collections import deque
+import numpy as np
+from util.grid import HEIGHT, WIDTH, solid_tiles
+
+# Monsters find their way over a grid of 8x8 cells, one per tile
+TILE = 8
+COLUMNS = WIDTH // TILE
+ROWS = HEIGHT // TILE
+# Monsters chase a player at most this many cells away along the way there,
+# and keep wandering otherwise
+CHASE_CELLS = 10
+STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def mark(cells, corners):
+    # Block every cell an 8x8 box at each corner covers, even in part
+    for x, y in corners:
+        x0, x1 = max(x // TILE, 0), min((x + TILE - 1) // TILE, COLUMNS - 1)
+        y0, y1 = max(y // TILE, 0), min((y + TILE - 1) // TILE, ROWS - 1)
+        cells[y0:y1 + 1, x0:x1 + 1] = True
+
+
+class FlowField:
+    # Breadth first search out from the player's cell over the free cells
+    # of one scene. Every cell gets its distance to the player and the step
+    # towards it, so any number of monsters share one search and each looks
+    # its way up in O(1). The search only runs again when the player moves
+    # to another cell or a boulder moves.
+    def __init__(self, walls=(), doors=()):
+        self.static = np.zeros((ROWS, COLUMNS), dtype=bool)
+        mark(self.static, solid_tiles(walls, doors))
+        self.key = None
+        self.distance = np.full((ROWS, COLUMNS), -1, dtype=np.int16)
+        self.step_x = np.zeros((ROWS, COLUMNS), dtype=np.int8)
+        self.step_y = np.zeros((ROWS, COLUMNS), dtype=np.int8)
+
+    def update(self, room, position):
+        cell = (min(max((position["x"] + 3) // TILE, 0), COLUMNS - 1),
+                min(max((position["y"] + 3) // TILE, 0), ROWS - 1))
+        key = (cell, room.boulder_x.tobytes(), room.boulder_y.tobytes())
+        if key != self.key:
+            self.key = key
+            blocked = self.static.copy()
+            mark(blocked, room.boulders())
+            self.search(blocked, cell)
+
+    def search(self, blocked, cell):
+        # Plain lists while searching, numpy indexing is slow one cell at a
+        # time
+        blocked = blocked.tolist()
+        distance = [[-1] * COLUMNS for row in range(0, ROWS)]
+        step_x = [[0] * COLUMNS for row in range(0, ROWS)]
+        step_y = [[0] * COLUMNS for row in range(0, ROWS)]
+        column, row = cell
+        distance[row][column] = 0
+        frontier = deque([cell])
+        while frontier:
+            column, row = frontier.popleft()
+            reached = distance[row][column] + 1
+            for dx, dy in STEPS:
+                x, y = column + dx, row + dy
+                if (0 <= x < COLUMNS and 0 <= y < ROWS and
+                        distance[y][x] < 0 and not blocked[y][x]):
+                    distance[y][x] = reached
+                    # From there, the way to the player is back here
+                    step_x[y][x] = -dx
+                    step_y[y][x] = -dy
+                    frontier.append((x, y))
+        self.distance[:] = distance
+        self.step_x[:] = step_x
+        self.step_y[:] = step_y
+
+    def chase(self, x, y, position):
+        # For monsters with corners x, y: which are close enough to chase,
+        # and their next one pixel step. A monster lines up with its cell
+        # across the way it is going first, so its box only ever covers
+        # free cells.
+        # np.clip costs more than the rest of this on arrays this small
+        column = np.minimum(np.maximum((x + TILE // 2) // TILE, 0),
+                            COLUMNS - 1)
+        row = np.minimum(np.maximum((y + TILE // 2) // TILE, 0), ROWS - 1)
+        distance = self.distance[row, column]
+        chasing = (distance >= 0) & (distance <= CHASE_CELLS)
+        if not chasing.any():
+            return chasing, 0, 0
+        step_x = self.step_x[row, column]
+        step_y = self.step_y[row, column]
+        off_x = np.sign(column * TILE - x)
+        off_y = np.sign(row * TILE - y)
+        across = step_x != 0
+        dx = np.where(across, step_x * (off_y == 0), off_x)
+        dy = np.where(across, off_y, step_y * (off_x == 0))
+        here = distance == 0
+        if here.any():
+            # In the player's own cell, head straight for the player
+            to_x = position["x"] - x
+            to_y = position["y"] - y
+            level = abs(to_x) >= abs(to_y)
+            dx = np.where(here, np.sign(to_x) * level, dx)
+            dy = np.where(here, np.sign(to_y) * ~level, dy)
+        return chasing, dx, dy
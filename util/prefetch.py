@@ -0,0 +1,97 @@
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from util.background import compose_background, to_rows
+from util.load_scene import load_scene, validate
+
+# Bytes of pre-rendered background rows kept ready at once. A room's rows
+# take about 19 KB, so this holds every neighbour of the busiest rooms.
+MEMORY_BUDGET = 256 * 1024
+
+
+def neighbours(room):
+    return set(door["gate"]["scene_name"] for door in room.doors
+               if door.get("gate", {}).get("scene_name"))
+
+
+class Prefetcher:
+    # Loads the rooms one door away from the current one on worker threads,
+    # so the next initialize_scene finds them parsed and pre-rendered.
+    def __init__(self, atlas, pack=None, workers=2, budget=MEMORY_BUDGET):
+        self.atlas = atlas
+        self.pack = pack
+        self.budget = budget
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Reentrant: a future that is already done runs its callback on
+        # the thread adding it, which holds the lock then
+        self.lock = threading.RLock()
+        self.wanted = set()
+        self.pending = dict()
+        self.ready = OrderedDict()
+
+    def enter(self, room):
+        with self.lock:
+            self.wanted = neighbours(room)
+            # Rooms that are no longer next door are not worth finishing
+            for name in list(self.pending):
+                if name not in self.wanted:
+                    self.pending.pop(name).cancel()
+            for name in self.wanted:
+                if name not in self.ready and name not in self.pending:
+                    future = self.executor.submit(self.prepare, name)
+                    self.pending[name] = future
+                    future.add_done_callback(partial(self.finished, name))
+
+    def prepare(self, name):
+        room = validate(load_scene(name, self.pack))
+        with self.lock:
+            if name not in self.wanted:
+                return
+        rows = to_rows(compose_background(
+            self.atlas, room.ground, room.walls, room.doors,
+            room.ground_map))
+        with self.lock:
+            if name not in self.pending:
+                return
+            self.ready[name] = (room, rows)
+            self.trim()
+
+    def finished(self, name, future):
+        # Nothing waits on the futures, so errors are reported here. The
+        # room is left out of pending either way, so entering it again
+        # tries once more, and loading it on the main thread raises the
+        # same error.
+        with self.lock:
+            if self.pending.get(name) is future:
+                del self.pending[name]
+        if not future.cancelled() and future.exception() is not None:
+            sys.stderr.write("Could not prefetch {}:\n".format(name))
+            error = future.exception()
+            traceback.print_exception(type(error), error,
+                                      error.__traceback__)
+
+    def trim(self):
+        # Drop rooms that are no longer next door first, then the oldest
+        def size():
+            return sum(len(rows) * len(rows[0])
+                       for room, rows in self.ready.values())
+        for name in [n for n in self.ready if n not in self.wanted]:
+            if size() <= self.budget:
+                return
+            del self.ready[name]
+        while self.ready and size() > self.budget:
+            self.ready.popitem(last=False)
+
+    def close(self):
+        with self.lock:
+            for future in list(self.pending.values()):
+                future.cancel()
+        self.executor.shutdown(wait=True)
+
+    def take(self, name):
+        # The prepared (scene record, background rows), if already done
+        with self.lock:
+            return self.ready.pop(name, None)
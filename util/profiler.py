@@ -0,0 +1,221 @@
+import atexit
+import csv
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+# Sections App times, in the order the overlay and the exports list them
+SECTIONS = ["input", "door", "collision", "pull", "monsters", "background",
+            "sprites", "fireball", "scene"]
+# Backend calls counted per frame
+CALLS = ["blt", "bltm", "text", "cls"]
+# Clock counters, as ticks run, ticks dropped and frames skipped per frame
+CLOCK = ["ticks", "dropped", "skipped"]
+# Frames the overlay's percentiles are taken over
+WINDOW = 120
+
+
+class Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append((self.name, time.perf_counter()))
+        return self
+
+    def __exit__(self, *exc_info):
+        name, start = self.profiler.stack.pop()
+        elapsed = time.perf_counter() - start
+        current = self.profiler.current
+        current[name] = current.get(name, 0.0) + elapsed
+        # Keep times exclusive: a nested section is not counted twice
+        if self.profiler.stack:
+            parent = self.profiler.stack[-1][0]
+            current[parent] = current.get(parent, 0.0) - elapsed
+        return False
+
+
+class CountingBackend:
+    # Hands everything through to the backend, counting the drawing calls
+    def __init__(self, pyxel, profiler):
+        self.pyxel = pyxel
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        attr = getattr(self.pyxel, name)
+        if name in CALLS:
+            profiler = self.profiler
+
+            def counted(*args, **kwargs):
+                calls = profiler.calls
+                calls[name] = calls.get(name, 0) + 1
+                return attr(*args, **kwargs)
+            # Found once, then a plain attribute lookup from here on
+            setattr(self, name, counted)
+            return counted
+        return attr
+
+
+class Profiler:
+    # Seconds spent in each named section, collected one dict per frame,
+    # with the drawing calls and clock counters of each frame alongside.
+    # history=None keeps every frame; the overlay only looks at the last
+    # WINDOW.
+    def __init__(self, history=None, export=None):
+        self.sections = dict()
+        self.stack = []
+        self.current = dict()
+        self.calls = dict()
+        self.frames = deque(maxlen=history)
+        self.frame_calls = deque(maxlen=history)
+        self.frame_clock = deque(maxlen=history)
+        self.clock_totals = dict()
+        self.frame_count = 0
+        self.visible = False
+        self.backend = None
+        self.exporter = None
+        if export:
+            self.exporter = open_exporter(export)
+            atexit.register(self.close)
+
+    def section(self, name):
+        if name not in self.sections:
+            self.sections[name] = Section(self, name)
+        return self.sections[name]
+
+    def wrap(self, pyxel):
+        self.backend = pyxel
+        return CountingBackend(pyxel, self)
+
+    def end_frame(self, clock=None):
+        # The clock's counters only ever grow, so a frame's share is what
+        # they went up by since the last one
+        steps = dict()
+        if clock is not None:
+            totals = clock.counters()
+            steps = dict((key, totals[key] - self.clock_totals.get(key, 0))
+                         for key in CLOCK)
+            self.clock_totals = totals
+        if self.exporter is not None:
+            self.exporter.write(self.frame_count, self.current, self.calls,
+                                steps)
+        self.frame_count += 1
+        self.frames.append(self.current)
+        self.frame_calls.append(self.calls)
+        self.frame_clock.append(steps)
+        self.current = dict()
+        self.calls = dict()
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def percentiles(self, name):
+        recent = list(self.frames)[-WINDOW:]
+        times = [frame.get(name, 0.0) for frame in recent]
+        if not times:
+            return 0.0, 0.0
+        p50, p99 = np.percentile(times, [50, 99])
+        return 1e6 * p50, 1e6 * p99
+
+    def overlay(self):
+        # Rolling p50 / p99 of each section in microseconds, and the ticks
+        # run, frames skipped and ticks dropped over the same frames, drawn
+        # straight on the backend so the overlay does not count itself
+        if not self.visible or self.backend is None:
+            return
+        pyxel = self.backend
+        lines = ["{:<10}{:>5.0f}{:>6.0f}".format(name, *self.percentiles(name))
+                 for name in SECTIONS]
+        last = self.frame_calls[-1] if self.frame_calls else {}
+        lines.append("blt {}".format(last.get("blt", 0)))
+        recent = list(self.frame_clock)[-WINDOW:]
+        clock = dict((key, sum(frame.get(key, 0) for frame in recent))
+                     for key in CLOCK)
+        lines.append("ticks {:<4}skip {}".format(clock["ticks"],
+                                                 clock["skipped"]))
+        lines.append("dropped {}".format(clock["dropped"]))
+        pyxel.rect(78, 16, 82, 7 * len(lines) + 10, 0)
+        pyxel.text(80, 18, "us        p50   p99", 7)
+        for i, line in enumerate(lines):
+            pyxel.text(80, 25 + 7 * i, line, 7)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+
+
+class CsvExporter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["frame"] + [s + "_us" for s in SECTIONS] +
+                             CALLS + CLOCK)
+
+    def write(self, frame, sections, calls, clock):
+        self.writer.writerow(
+            [frame] + ["{:.1f}".format(1e6 * sections.get(s, 0.0))
+                       for s in SECTIONS] +
+            [calls.get(c, 0) for c in CALLS] +
+            [clock.get(c, 0) for c in CLOCK])
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesExporter:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def write(self, frame, sections, calls, clock):
+        self.file.write(json.dumps({
+            "frame": frame,
+            "sections_us": {k: round(1e6 * v, 1)
+                            for k, v in sections.items()},
+            "calls": calls,
+            "clock": clock}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def open_exporter(path):
+    # The file name picks the format: .csv, or JSON lines for anything else
+    if os.path.splitext(path)[1].lower() == ".csv":
+        return CsvExporter(path)
+    return JsonLinesExporter(path)
+
+
+class NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullProfiler:
+    # Stand-in when nobody is measuring: every section is the same no-op
+    null_section = NullSection()
+    visible = False
+
+    def section(self, name):
+        return self.null_section
+
+    def wrap(self, pyxel):
+        return pyxel
+
+    def end_frame(self, clock=None):
+        pass
+
+    def toggle(self):
+        pass
+
+    def overlay(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,105 @@
+import numpy as np
+from util.grid import solid_tiles
+
+# Fireballs, like everything they can hit, fill an 8x8 box
+SIZE = 8
+# Pixels a fireball covers per tick, and how far it flies before fizzling
+SPEED = 1
+RANGE = 100
+# Most fireballs in the air at once
+MAX_FLYING = 4
+VELOCITY = {"right": (1, 0), "left": (-1, 0), "up": (0, -1), "down": (0, 1)}
+
+
+def slab(start, velocity, low, high):
+    # When a point moving from start enters and leaves the open interval
+    # (low, high) along one axis, in fractions of the move
+    if velocity == 0:
+        inside = (low < start) & (start < high)
+        return (np.where(inside, -np.inf, np.inf),
+                np.where(inside, np.inf, -np.inf))
+    first = (low - start) / velocity
+    second = (high - start) / velocity
+    return np.minimum(first, second), np.maximum(first, second)
+
+
+def sweep(x, y, vx, vy, box_x, box_y):
+    # Swept AABB test of a fireball moving from (x, y) by (vx, vy) against
+    # the boxes at box_x, box_y. Growing each box by the fireball's size
+    # turns it into a ray test. Gives the fraction of the move at which the
+    # two first overlap, inf for the boxes it misses; boxes it only touches
+    # at the end of the move are hit on the next one.
+    enter_x, leave_x = slab(x, vx, box_x - SIZE, box_x + SIZE)
+    enter_y, leave_y = slab(y, vy, box_y - SIZE, box_y + SIZE)
+    enter = np.maximum(enter_x, enter_y)
+    leave = np.minimum(leave_x, leave_y)
+    hit = (enter < leave) & (enter < 1) & (leave > 0)
+    return np.where(hit, np.maximum(enter, 0), np.inf)
+
+
+def first_hit(times):
+    # Earliest time in a sweep and which box it belongs to, if any was hit
+    if not len(times):
+        return np.inf, None
+    i = int(np.argmin(times))
+    if times[i] == np.inf:
+        return np.inf, None
+    return times[i], i
+
+
+class Projectiles:
+    # Fireballs in flight in the current scene. Every tick each one is swept
+    # against the boxes of the scene, border stones, walls, doors, boulders
+    # and living monsters, so a tick costs O(entities) however fast they
+    # fly, and nothing is read back from the frame.
+    def __init__(self, walls=(), doors=(), speed=SPEED):
+        corners = solid_tiles(walls, doors)
+        self.solid_x = np.array([x for x, y in corners], dtype=float)
+        self.solid_y = np.array([y for x, y in corners], dtype=float)
+        self.speed = speed
+        self.flying = []
+
+    def fire(self, x, y, direction):
+        if len(self.flying) >= MAX_FLYING:
+            return False
+        dx, dy = VELOCITY[direction]
+        self.flying.append({"x": x, "y": y, "vx": dx * self.speed,
+                            "vy": dy * self.speed, "range": RANGE,
+                            "animate": 0})
+        return True
+
+    def step(self, room, monsters):
+        # Fly every fireball one tick. A fireball goes out on the first box
+        # it meets, killing it if that is a monster. Returns the monsters
+        # killed.
+        boulder_x = room.boulder_x.astype(float)
+        boulder_y = room.boulder_y.astype(float)
+        killed = []
+        flying = []
+        for ball in self.flying:
+            x, y, vx, vy = ball["x"], ball["y"], ball["vx"], ball["vy"]
+            blocked = min(
+                first_hit(sweep(x, y, vx, vy, self.solid_x,
+                                self.solid_y))[0],
+                first_hit(sweep(x, y, vx, vy, boulder_x, boulder_y))[0])
+            living = monsters.living()
+            when, i = first_hit(sweep(x, y, vx, vy,
+                                      monsters.x[living].astype(float),
+                                      monsters.y[living].astype(float)))
+            if i is not None and when <= blocked:
+                monsters.kill(living[i])
+                killed.append(int(living[i]))
+                continue
+            if blocked < np.inf:
+                continue
+            ball["x"] += vx
+            ball["y"] += vy
+            ball["range"] -= abs(vx) + abs(vy)
+            ball["animate"] = 1 - ball["animate"]
+            if ball["range"] > 0:
+                flying.append(ball)
+        self.flying = flying
+        return killed
+
+    def clear(self):
+        self.flying = []
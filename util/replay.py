@@ -0,0 +1,90 @@
+import atexit
+import json
+
+# Saved sessions: the seed and scene a run started from, then per frame the
+# number of simulation ticks it ran and the btnp calls that returned True.
+VERSION = 1
+
+
+class LiveInput:
+    # Keys are asked for by name, e.g. "KEY_Q", so a recording made with
+    # Pyxel can be played back on the headless backend and the other way
+    def __init__(self, pyxel):
+        self.pyxel = pyxel
+        self.finished = False
+
+    def btnp(self, key, hold=0, period=0):
+        return self.pyxel.btnp(getattr(self.pyxel, key), hold=hold,
+                               period=period)
+
+    def frame(self, ticks):
+        # How many ticks the frame runs, once the clock has had its say
+        return ticks
+
+    def close(self):
+        pass
+
+
+class InputRecorder(LiveInput):
+    def __init__(self, pyxel, path, seed, scene_name):
+        LiveInput.__init__(self, pyxel)
+        self.path = path
+        self.session = {"version": VERSION, "seed": seed,
+                        "scene_name": scene_name, "frames": []}
+        self.pressed = []
+        # Pyxel's own quit key exits without going through the game
+        atexit.register(self.close)
+
+    def btnp(self, key, hold=0, period=0):
+        pressed = LiveInput.btnp(self, key, hold, period)
+        if pressed:
+            self.pressed.append([key, hold, period])
+        return pressed
+
+    def frame(self, ticks):
+        self.session["frames"].append([ticks, self.pressed])
+        self.pressed = []
+        return ticks
+
+    def close(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.session, f, separators=(",", ":"))
+
+
+class InputReplay(LiveInput):
+    # Answers btnp from a recording and runs the recorded number of ticks
+    # each frame, whatever the clock says
+    def __init__(self, session):
+        LiveInput.__init__(self, None)
+        self.frames = session["frames"]
+        self.position = 0
+        self.pressed = set()
+        self.load_frame()
+
+    def load_frame(self):
+        if self.position < len(self.frames):
+            ticks, pressed = self.frames[self.position]
+            self.pressed = set(tuple(call) for call in pressed)
+        else:
+            self.pressed = set()
+            self.finished = True
+
+    def btnp(self, key, hold=0, period=0):
+        return (key, hold, period) in self.pressed
+
+    def frame(self, ticks):
+        if self.finished:
+            return 0
+        ticks = self.frames[self.position][0]
+        self.position += 1
+        self.load_frame()
+        return ticks
+
+
+def load_session(path):
+    with open(path) as f:
+        session = json.load(f)
+    if session.get("version") != VERSION:
+        raise ValueError("{}: not a version {} recording".format(
+            path, VERSION))
+    return session
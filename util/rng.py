@@ -0,0 +1,60 @@
+import numpy as np
+
+# Random values drawn from the generator at a time and handed out in slices
+BATCH = 4096
+
+
+class RandomStream:
+    # Pre-drawn integers in [0, high), so a frame's worth of rolls is a
+    # slice of an array instead of a call into the generator per value
+    def __init__(self, state, high, batch=BATCH):
+        self.state = state
+        self.high = high
+        self.batch = batch
+        self.pool = np.empty(0, dtype=np.int16)
+        self.used = 0
+
+    def take(self, count):
+        if self.used + count > len(self.pool):
+            fresh = self.state.randint(0, self.high,
+                                       size=max(self.batch, count))
+            self.pool = np.concatenate(
+                [self.pool[self.used:], fresh.astype(np.int16)])
+            self.used = 0
+        values = self.pool[self.used:self.used + count]
+        self.used += count
+        return values
+
+
+def new_seed():
+    return int(np.random.randint(0, 2**31 - 1))
+
+
+class EngineRandom:
+    # Every random decision the game makes, from one seed. The simulation
+    # and the purely cosmetic effects draw from separate streams, so drawing
+    # more or fewer frames never changes where the monsters go.
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = new_seed()
+        self.seed = seed
+        seeds = np.random.RandomState(seed).randint(0, 2**31 - 1, size=2)
+        self.simulation = np.random.RandomState(seeds[0])
+        self.cosmetic = np.random.RandomState(seeds[1])
+        self.streams = dict()
+
+    def stream(self, high, cosmetic=False):
+        key = (high, cosmetic)
+        if key not in self.streams:
+            state = self.cosmetic if cosmetic else self.simulation
+            self.streams[key] = RandomStream(state, high)
+        return self.streams[key]
+
+    def rolls(self, high, shape):
+        # Integers in [0, high) shaped as asked, for vectorised steps
+        count = int(np.prod(shape))
+        return self.stream(high).take(count).reshape(shape)
+
+    def flicker(self, chance):
+        # True one time in chance, for animations that only look random
+        return int(self.stream(chance, cosmetic=True).take(1)[0]) == 0
@@ -0,0 +1,195 @@
+import marshal
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+SAVE_PATH = "saves/journal.dat"
+# Every record: name (a room, or PLAYER), payload length, crc32 of payload
+RECORD = struct.Struct("<32sII")
+PLAYER = "@player"
+# The journal is rewritten with only the newest record of each name once it
+# is this many times bigger than those records, and at least COMPACT_MIN
+COMPACT_RATIO = 4
+COMPACT_MIN = 16 * 1024
+# Fixed ticks between autosaves, ten seconds at 30 ticks per second
+AUTOSAVE_TICKS = 300
+
+
+def encode_room(room):
+    # Dead flags are kept one bit per monster
+    return marshal.dumps({"boulder_x": room.boulder_x.tobytes(),
+                          "boulder_y": room.boulder_y.tobytes(),
+                          "monster_x": room.monster_x.tobytes(),
+                          "monster_y": room.monster_y.tobytes(),
+                          "monster_dead": np.packbits(
+                              ~room.monster_alive).tobytes()})
+
+
+def apply_room(room, payload):
+    data = marshal.loads(payload)
+    arrays = dict()
+    for key in ("boulder_x", "boulder_y", "monster_x", "monster_y"):
+        arrays[key] = np.frombuffer(data[key], dtype=np.int16).copy()
+        if len(arrays[key]) != len(getattr(room, key)):
+            # The scene file changed since the save, start the room afresh
+            return False
+    dead = np.unpackbits(np.frombuffer(data["monster_dead"], dtype=np.uint8))
+    count = len(room.monster_alive)
+    if len(dead) != (count + 7) // 8 * 8:
+        return False
+    arrays["monster_alive"] = dead[:count] == 0
+    for key, array in arrays.items():
+        setattr(room, key, array)
+    room.changed = True
+    return True
+
+
+def pack_record(name, payload):
+    return RECORD.pack(name.encode("utf-8"), len(payload),
+                       zlib.crc32(payload)) + payload
+
+
+def read_records(data):
+    # (name, payload offset, payload length) of every intact record. A torn
+    # write at the end, from a crash, ends the list.
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        raw_name, length, crc = RECORD.unpack_from(data, offset)
+        start = offset + RECORD.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        yield raw_name.rstrip(b"\0").decode("utf-8"), start, length
+        offset = start + length
+
+
+class Journal:
+    # Append-only save file. checkpoint() hands the rooms changed since the
+    # last one to a writer thread, so saving never waits on the disk, and
+    # restore() reads a room's newest record the first time it is entered.
+    def __init__(self, path=SAVE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = dict()
+        self.size = 0
+        self.restored = set()
+        self.queue = queue.Queue()
+        self.writer = None
+        self.scan()
+
+    def scan(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for name, start, length in read_records(data):
+            self.index[name] = (start, length)
+            self.size = start + length
+        if self.size < len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.size)
+
+    def read(self, name):
+        with self.lock:
+            if name not in self.index:
+                return None
+            start, length = self.index[name]
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                return f.read(length)
+
+    def player(self):
+        payload = self.read(PLAYER)
+        return marshal.loads(payload) if payload is not None else None
+
+    def restore(self, room):
+        if room.name in self.restored:
+            return
+        self.restored.add(room.name)
+        payload = self.read(room.name)
+        if payload is not None:
+            apply_room(room, payload)
+
+    def checkpoint(self, state, player):
+        # Cheap on the calling thread: one record per changed room, sharing
+        # the arrays until the game next writes to them
+        rooms = [state.copy_room(name) for name in state.take_dirty()]
+        self.queue.put((rooms, dict(player)))
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop,
+                                           daemon=True)
+            self.writer.start()
+
+    def close(self):
+        # Wait for everything handed over so far to reach the disk
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def write_loop(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            rooms, player = job
+            records = [(room.name, encode_room(room)) for room in rooms]
+            records.append((PLAYER, marshal.dumps(player)))
+            self.append(records)
+            live = sum(length for start, length in self.index.values())
+            if self.size > max(COMPACT_MIN, COMPACT_RATIO * live):
+                self.compact()
+
+    def append(self, records):
+        with open(self.path, 'ab') as f:
+            offset = self.size
+            placed = dict()
+            for name, payload in records:
+                f.write(pack_record(name, payload))
+                placed[name] = (offset + RECORD.size, len(payload))
+                offset += RECORD.size + len(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            self.index.update(placed)
+            self.size = offset
+
+    def compact(self):
+        # Only this thread writes the journal, so it can be read unlocked
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        temp = self.path + ".tmp"
+        index = dict()
+        offset = 0
+        with open(temp, 'wb') as f:
+            for name, (start, length) in sorted(self.index.items()):
+                f.write(pack_record(name, data[start:start + length]))
+                index[name] = (offset + RECORD.size, length)
+                offset += RECORD.size + length
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            os.replace(temp, self.path)
+            self.index = index
+            self.size = offset
+
+
+class NullJournal:
+    # Stand-in when the game is not being saved, as in benchmark runs
+    def player(self):
+        return None
+
+    def restore(self, room):
+        pass
+
+    def checkpoint(self, state, player):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,350 @@
+# Checks that the boulder puzzles of every room can be solved: which doors
+# the player can never get to, and which pushes lock a door away for good.
+# Each room is a breadth first search over where its boulders are, moving
+# them with the game's own move_player, so the answers match real play.
+# Rooms are searched in parallel.
+#
+#     python -m util.solve_scenes [--step 8] [--max-states 1000] [ROOM ...]
+
+import argparse
+import glob
+import os
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from util.atlas import load_atlas
+from util.collision import detect_door, get_character_bubble
+from util.grid import HEIGHT, PAD, WIDTH, SceneGrid
+from util.load_scene import load_scene
+from util.movable import OPPOSITE, PLAYER_EDGES, SIZE, boulder_chain
+from util.movement import MOVES, can_pull, move_player
+from util.spatial import SpatialHash
+from util.world_state import RoomState, room_key
+
+# Pixels the player walks for each push or pull explored. 1 follows every
+# pixel the game allows, but the searches grow with the square of it.
+STEP = 8
+# Rooms with more boulder positions than this are only partly checked.
+# Only a1 and a2 get there, and a whole run stays under a minute on one
+# core; the time grows a little faster than this does.
+MAX_STATES = 1000
+# Player positions tried for each push before it is given up
+TRIES = 3
+# What the player cannot walk into: borders, boulders, walls and doors
+SOLID = [13, 2, 9, 4]
+# Locked positions reported per room
+EXAMPLES = 3
+# The room the game starts in, the only one entered other than by a door
+START = "a1"
+
+
+def placements(grid):
+    # Where the player's 6x7 sprite fits without covering anything solid
+    solid = np.isin(grid.cells, SOLID)[PAD:PAD + HEIGHT, PAD:PAD + WIDTH]
+    total = np.zeros((HEIGHT + 1, WIDTH + 1), dtype=np.int32)
+    total[1:, 1:] = solid.cumsum(axis=0).cumsum(axis=1)
+    covered = total[7:, 6:] - total[:-7, 6:] - total[7:, :-6] + total[:-7, :-6]
+    free = np.zeros((HEIGHT, WIDTH), dtype=bool)
+    free[:HEIGHT - 6, :WIDTH - 5] = covered == 0
+    return free
+
+
+def runs(free):
+    # Number every run of free cells along each row from 1, 0 elsewhere
+    starts = free.copy()
+    starts[:, 1:] &= ~free[:, :-1]
+    return np.where(free, np.cumsum(starts).reshape(free.shape), 0)
+
+
+def flood(free, position):
+    # Every position the player can walk to from position, one pixel at a
+    # time, without moving anything. Whole rows and columns of free cells
+    # are taken at once, so it takes as many rounds as the way has turns.
+    rows = runs(free)
+    columns = runs(free.T).T
+    reach = np.zeros_like(free)
+    reach[position["y"], position["x"]] = True
+    while True:
+        taken = np.zeros(rows.max() + 1, dtype=bool)
+        taken[rows[reach]] = True
+        taken[0] = False
+        grown = taken[rows]
+        taken = np.zeros(columns.max() + 1, dtype=bool)
+        taken[columns[grown]] = True
+        taken[0] = False
+        grown |= taken[columns]
+        grown[position["y"], position["x"]] = True
+        if (grown == reach).all():
+            return reach
+        reach = grown
+
+
+def facing(x, y, side):
+    # Player positions whose strip on that side overlaps the 8x8 box at x, y
+    ex, ey, width, height = PLAYER_EDGES[side]
+    for px in range(x - ex - width + 1, x + SIZE - ex):
+        for py in range(y - ey - height + 1, y + SIZE - ey):
+            if 0 <= px < WIDTH and 0 <= py < HEIGHT:
+                yield px, py
+
+
+def place(grid, boulder_x, boulder_y):
+    # Put the room's boulders back where a state has them
+    grid.room.boulder_x = boulder_x.copy()
+    grid.room.boulder_y = boulder_y.copy()
+    grid.boulder_index = SpatialHash()
+    for i, (x, y) in enumerate(grid.room.boulders()):
+        grid.boulder_index.insert(i, x, y)
+    grid.refresh(-PAD, -PAD, WIDTH + PAD, HEIGHT + PAD)
+
+
+def doors_reached(grid, reach, door_index, doors):
+    found = set()
+    for door in doors:
+        for direction in sorted(MOVES):
+            for x, y in facing(door["x"], door["y"], direction):
+                if not reach[y, x]:
+                    continue
+                is_door, door_id = detect_door(
+                    grid, {"x": x, "y": y}, direction, door_index)
+                if is_door:
+                    found.add(door_id)
+                    break
+    return found
+
+
+def against(boulders, x, y, width, height):
+    # Boulders overlapping a strip. With the few boulders of a room a plain
+    # loop beats the spatial index here.
+    return tuple(i for i, bx, by in boulders
+                 if bx - width < x < bx + SIZE and
+                 by - height < y < by + SIZE)
+
+
+def moves(grid, reach):
+    # Up to TRIES player positions for each distinct push and pull: the
+    # direction, whether pulling, and the boulders the player is up against
+    boulders = [(i, x, y) for i, (x, y) in enumerate(grid.room.boulders())]
+    groups = dict()
+    for i, x, y in boulders:
+        for direction in sorted(MOVES):
+            for pulling in (False, True):
+                side = OPPOSITE[direction] if pulling else direction
+                ex, ey, width, height = PLAYER_EDGES[side]
+                for px, py in facing(x, y, side):
+                    if not reach[py, px]:
+                        continue
+                    seeds = against(boulders, px + ex, py + ey, width,
+                                    height)
+                    tried = groups.setdefault((direction, pulling, seeds), [])
+                    if len(tried) >= TRIES:
+                        continue
+                    # Only surfaces that take a pull, as in move_player
+                    if pulling and not can_pull(get_character_bubble(
+                            grid, {"x": px, "y": py})[MOVES[direction][3]]):
+                        continue
+                    tried.append({"x": px, "y": py})
+    for (direction, pulling, seeds), positions in sorted(groups.items()):
+        # Pushes the chain solver turns down need not be played out
+        if positions and (pulling or
+                          boulder_chain(grid, seeds, direction) is not None):
+            yield direction, pulling, positions
+
+
+def describe(boulder_x, boulder_y, start_x, start_y):
+    moved = np.flatnonzero((boulder_x != start_x) | (boulder_y != start_y))
+    return ", ".join("boulder {} at {}, {}".format(i, boulder_x[i],
+                                                   boulder_y[i])
+                     for i in moved.tolist())
+
+
+def solve_room(job):
+    # One room, searched from every way into it at once, so positions
+    # reached from two doors are only explored once
+    name, entries, step, max_states = job
+    errors, warnings = [], []
+    result = {"name": name, "errors": errors, "warnings": warnings}
+    scene = load_scene(name)
+    room = RoomState(name, scene.mv_boulders)
+    grid = SceneGrid(load_atlas(), scene.walls, scene.doors, room)
+    door_index = SpatialHash()
+    for i, door in enumerate(scene.doors):
+        door_index.insert(i, door["x"], door["y"])
+    start_x, start_y = room.boulder_x.copy(), room.boulder_y.copy()
+
+    seen = dict()
+    states = []
+    parents = []
+    roots = []
+    links = []
+    doors = []
+    # Moves out of each state still waiting in pending
+    waiting = []
+    pending = deque((start_x, start_y, dict(entry), None)
+                    for entry in entries)
+    while pending and len(states) < max_states:
+        boulder_x, boulder_y, position, parent = pending.popleft()
+        if parent is not None:
+            waiting[parent] -= 1
+        place(grid, boulder_x, boulder_y)
+        reach = flood(placements(grid), position)
+        key = (boulder_x.tobytes(), boulder_y.tobytes(),
+               int(np.argmax(reach)))
+        if key in seen:
+            if parent is not None:
+                links[parent].add(seen[key])
+            continue
+        state = len(states)
+        seen[key] = state
+        states.append((boulder_x, boulder_y))
+        parents.append(parent)
+        roots.append(state if parent is None else roots[parent])
+        links.append(set())
+        waiting.append(0)
+        if parent is not None:
+            links[parent].add(state)
+        doors.append(doors_reached(grid, reach, door_index, scene.doors))
+        for direction, pulling, positions in moves(grid, reach):
+            for position in positions:
+                # Played out pixel by pixel, as the game would
+                moved = dict(position)
+                move_player(grid, moved, direction, step, door_index,
+                            pulling)
+                if (not np.array_equal(room.boulder_x, boulder_x) or
+                        not np.array_equal(room.boulder_y, boulder_y)):
+                    pending.append((room.boulder_x.copy(),
+                                    room.boulder_y.copy(), moved, state))
+                    waiting[state] += 1
+                    place(grid, boulder_x, boulder_y)
+                    break
+    result["states"] = len(states)
+    finished = not pending
+
+    reached = set().union(*doors) if doors else set()
+    for i, door in enumerate(scene.doors):
+        if i in reached:
+            continue
+        text = "door at {}, {} to {} cannot be reached".format(
+            door["x"], door["y"], door["gate"]["scene_name"])
+        if finished:
+            errors.append(text)
+        else:
+            warnings.append(text + " in the first {} states".format(
+                len(states)))
+    if not finished:
+        warnings.append("stopped after {} states, dead-locks were only "
+                        "looked for among them".format(len(states)))
+
+    back = [[] for state in states]
+    for state, children in enumerate(links):
+        for child in children:
+            back[child].append(state)
+    # States that might lead somewhere not searched yet are never called
+    # locked
+    unsure = leading_to(back, [s for s in range(0, len(states))
+                               if waiting[s] > 0])
+    can_reach = dict((i, leading_to(back, [s for s in range(0, len(states))
+                                           if i in doors[s]]))
+                     for i in reached)
+
+    def lost(state):
+        if state is None or state in unsure:
+            return []
+        return [i for i in sorted(can_reach)
+                if roots[state] in can_reach[i] and
+                state not in can_reach[i]]
+
+    # The pushes that lose a door: locked states whose parent was not,
+    # once for each place the boulders end up
+    locks = OrderedDict()
+    for state in range(0, len(states)):
+        if lost(state) and not lost(parents[state]):
+            text = describe(*states[state], start_x, start_y)
+            locks.setdefault(text, lost(state))
+    for text, gone in list(locks.items())[:EXAMPLES]:
+        warnings.append("{} locks the door at {} away".format(
+            text, " and ".join("{}, {}".format(scene.doors[i]["x"],
+                                               scene.doors[i]["y"])
+                               for i in gone)))
+    if len(locks) > EXAMPLES:
+        warnings.append("{} more boulder positions lock a door away".format(
+            len(locks) - EXAMPLES))
+    return result
+
+
+def leading_to(back, targets):
+    # The targets and every state with a way to one of them
+    found = set(targets)
+    frontier = list(found)
+    while frontier:
+        for before in back[frontier.pop()]:
+            if before not in found:
+                found.add(before)
+                frontier.append(before)
+    return found
+
+
+def entries(names):
+    # Where the player can come into each room: its start position, and
+    # the gates of every door leading to it
+    found = dict((room_key(name), []) for name in names)
+    for name in names:
+        scene = load_scene(name)
+        if name == START:
+            found[room_key(name)].append(dict(scene.position))
+        for door in scene.doors:
+            gate = door["gate"]
+            target = room_key(gate["scene_name"])
+            if target in found:
+                found[target].append({"x": gate["x"], "y": gate["y"]})
+    for name in found:
+        found[name] = [dict(entry) for entry in sorted(
+            set(tuple(sorted(entry.items())) for entry in found[name]))]
+    return found
+
+
+def solve_scenes(rooms=None, step=STEP, max_states=MAX_STATES,
+                 workers=None, report=print):
+    names = sorted(os.path.basename(path).replace('.yaml', '')
+                   for path in glob.glob(os.path.join("scenes", "*.yaml")))
+    unknown = [name for name in rooms or () if name not in names]
+    if unknown:
+        raise ValueError("no scene file for {}".format(", ".join(unknown)))
+    ways_in = entries(names)
+    rooms = sorted(set(room_key(name) for name in (rooms or names)))
+    jobs = [(name, ways_in[name], step, max_states) for name in rooms
+            if ways_in[name]]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(solve_room, jobs))
+    failed = False
+    for result in results:
+        problems = [("error", e) for e in result["errors"]]
+        problems += [("warning", w) for w in result["warnings"]]
+        for level, text in problems:
+            report("{}: {}: {}".format(result["name"], level, text))
+        failed = failed or bool(result["errors"])
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that every door of every room can be reached")
+    parser.add_argument("rooms", nargs="*",
+                        help="rooms to check, all of them by default")
+    parser.add_argument("--step", type=int, default=STEP,
+                        help="pixels per push or pull explored")
+    parser.add_argument("--max-states", type=int, default=MAX_STATES)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        solved = solve_scenes(args.rooms, args.step, args.max_states,
+                              args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    if not solved:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
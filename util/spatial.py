@@ -0,0 +1,86 @@
+# Uniform grid over the arena. Each cell holds the keys of the entities
+# whose top left corner falls inside it, so lookups only visit the few
+# cells around the point of interest.
+CELL_SIZE = 16
+
+
+class SpatialHash:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.buckets = dict()
+        self.positions = dict()
+        # Smallest and largest cell ever used since the hash was last empty,
+        # as [left, top, right, bottom]. Removals leave it as it is, which
+        # only makes nearest() look a little further than it has to.
+        self.bounds = None
+
+    def cell(self, x, y):
+        return (int(x) // self.cell_size, int(y) // self.cell_size)
+
+    def insert(self, key, x, y):
+        self.positions[key] = (int(x), int(y))
+        cell = self.cell(x, y)
+        self.buckets.setdefault(cell, set()).add(key)
+        if self.bounds is None:
+            self.bounds = [cell[0], cell[1], cell[0], cell[1]]
+        bounds = self.bounds
+        bounds[0] = min(bounds[0], cell[0])
+        bounds[1] = min(bounds[1], cell[1])
+        bounds[2] = max(bounds[2], cell[0])
+        bounds[3] = max(bounds[3], cell[1])
+
+    def remove(self, key):
+        x, y = self.positions.pop(key)
+        bucket = self.buckets[self.cell(x, y)]
+        bucket.discard(key)
+        if not bucket:
+            del self.buckets[self.cell(x, y)]
+        if not self.positions:
+            self.bounds = None
+
+    def move(self, key, x, y):
+        old_x, old_y = self.positions[key]
+        if self.cell(old_x, old_y) != self.cell(x, y):
+            self.remove(key)
+            self.insert(key, x, y)
+        else:
+            self.positions[key] = (int(x), int(y))
+
+    def nearest(self, x, y):
+        # Walk rings of cells outwards. Anything in ring r + 1 is at least
+        # r cells away, which bounds how far the search has to go.
+        if not self.positions:
+            return None
+        cx, cy = self.cell(x, y)
+        left, top, right, bottom = self.bounds
+        reach = max(cx - left, right - cx, cy - top, bottom - cy)
+        best = None
+        for ring in range(0, reach + 1):
+            if best is not None and best[0] < (
+                    (ring - 1) * self.cell_size)**2:
+                break
+            for key in self.ring(cx, cy, ring):
+                px, py = self.positions[key]
+                candidate = ((px - x)**2 + (py - y)**2, key)
+                if best is None or candidate < best:
+                    best = candidate
+        return best[1]
+
+    def ring(self, cx, cy, ring):
+        for bx in range(cx - ring, cx + ring + 1):
+            for by in range(cy - ring, cy + ring + 1):
+                if max(abs(bx - cx), abs(by - cy)) == ring:
+                    yield from self.buckets.get((bx, by), ())
+
+    def in_rect(self, x0, y0, x1, y1):
+        # Keys of every entity with its corner inside [x0, x1) x [y0, y1)
+        found = []
+        left, top = self.cell(x0, y0)
+        right, bottom = self.cell(x1 - 1, y1 - 1)
+        for bx in range(left, right + 1):
+            for by in range(top, bottom + 1):
+                for key in self.buckets.get((bx, by), ()):
+                    px, py = self.positions[key]
+                    if x0 <= px < x1 and y0 <= py < y1:
+                        found.append(key)
+        return found
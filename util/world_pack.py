@@ -0,0 +1,97 @@
+import marshal
+import mmap
+import os
+import struct
+import zlib
+import yaml
+
+# Compiled form of the scenes/ directory. Layout:
+#   header  - magic, pack version, marshal version, flags, room count
+#   index   - one entry per room: name, payload offset, payload length, and
+#             the crc32, size and mtime of the YAML source it was built from
+#   payload - each room's YAML data, marshalled
+# util.compile_scenes is the only writer, so every pack has been checked.
+PACK_PATH = "scenes/world.pack"
+MAGIC = b"DDWP"
+VERSION = 3
+HEADER = struct.Struct("<4sBBBH")
+ENTRY = struct.Struct("<32sIIIIQ")
+# Set by util.compile_scenes: every room passed validation and its data
+# has every field filled in, so loading it needs no defaults or checks
+VALIDATED = 1
+
+
+def write_pack(rooms, pack_path=PACK_PATH, flags=0):
+    # rooms: (name, (crc32, size, mtime in ns) of the YAML source,
+    # marshalled data) per room
+    offset = HEADER.size + ENTRY.size * len(rooms)
+    with open(pack_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, marshal.version, flags,
+                            len(rooms)))
+        for name, source, payload in rooms:
+            f.write(ENTRY.pack(name.encode(), offset, len(payload), *source))
+            offset += len(payload)
+        for name, source, payload in rooms:
+            f.write(payload)
+    return len(rooms)
+
+
+class WorldPack:
+    def __init__(self, path=PACK_PATH):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, marshal_version, flags, count = HEADER.unpack_from(
+            self.data, 0)
+        if (magic, version, marshal_version) != (
+                MAGIC, VERSION, marshal.version):
+            self.data.close()
+            raise ValueError("{} is not a usable world pack".format(path))
+        self.validated = bool(flags & VALIDATED)
+        self.index = dict()
+        for i in range(0, count):
+            name, offset, length, crc, size, mtime = ENTRY.unpack_from(
+                self.data, HEADER.size + ENTRY.size * i)
+            self.index[name.rstrip(b"\0").decode()] = (offset, length, crc,
+                                                       size, mtime)
+
+    def is_fresh(self, scene, path):
+        # Size and mtime as packed say the YAML is untouched without
+        # reading it. Otherwise, as after a copy, its crc32 decides.
+        entry = self.index.get(scene)
+        if entry is None:
+            return False
+        stat = os.stat(path)
+        if stat.st_size != entry[3]:
+            return False
+        if stat.st_mtime_ns == entry[4]:
+            return True
+        with open(path, 'rb') as f:
+            return zlib.crc32(f.read()) == entry[2]
+
+    def room(self, scene):
+        # Rooms are only decoded when asked for
+        offset, length = self.index[scene][:2]
+        return marshal.loads(self.data[offset:offset + length])
+
+
+def open_pack(path=PACK_PATH):
+    # A missing or foreign pack just means everything comes from YAML
+    try:
+        return WorldPack(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def read_room(scene, pack=None, scenes_dir="scenes"):
+    # Use the pack only if it was built from this exact YAML file, so an
+    # edited scene is never shadowed by a stale pack. Also says whether the
+    # data comes validated from util.compile_scenes.
+    path = os.path.join(scenes_dir, "{}.yaml".format(scene))
+    if pack is not None and pack.is_fresh(scene, path):
+        return pack.room(scene), pack.validated
+    with open(path, 'rb') as f:
+        return yaml.safe_load(f.read()), False
+
+
+def load_room(scene, pack=None, scenes_dir="scenes"):
+    return read_room(scene, pack, scenes_dir)[0]
@@ -0,0 +1,195 @@
+import tempfile
+from collections import OrderedDict
+import numpy as np
+from util.save import COMPACT_MIN, COMPACT_RATIO, apply_room, encode_room
+
+# Rooms kept in memory at once. Rooms pinned as the working set, the current
+# one and those next door, are never evicted.
+RESIDENT_ROOMS = 16
+# Scenes that are another name for the same room. The game starts in a1,
+# whose file only adds a starting position, but its doors lead back into
+# a1_duplicate, so both names share one set of boulders and monsters.
+ALIASES = {"a1": "a1_duplicate"}
+
+
+def room_key(scene_name):
+    return ALIASES.get(scene_name, scene_name)
+
+
+def coordinates(entities, key):
+    return np.array([entity[key] for entity in entities], dtype=np.int16)
+
+
+class RoomState:
+    # Boulders and monsters of one room as small arrays. Snapshots share
+    # the arrays until the live room is next written to, which copies them.
+    __slots__ = ("name", "boulder_x", "boulder_y", "monster_x", "monster_y",
+                 "monster_alive", "monster_types", "shared", "dirty",
+                 "changed")
+
+    def __init__(self, name, mv_boulders=(), monsters=(), dirty=None):
+        self.name = name
+        self.boulder_x = coordinates(mv_boulders, "x")
+        self.boulder_y = coordinates(mv_boulders, "y")
+        self.monster_x = coordinates(monsters, "x")
+        self.monster_y = coordinates(monsters, "y")
+        self.monster_alive = np.array(
+            [not m.get('dead', False) for m in monsters], dtype=bool)
+        self.monster_types = tuple(m.get('monster_type') for m in monsters)
+        self.shared = False
+        self.dirty = dirty
+        # Differs from the scene file, so has to be kept when evicted
+        self.changed = False
+
+    def copy(self):
+        twin = RoomState.__new__(RoomState)
+        for name in RoomState.__slots__:
+            setattr(twin, name, getattr(self, name))
+        twin.dirty = None
+        twin.shared = self.shared = True
+        return twin
+
+    def own(self):
+        # Copy on the first write after a snapshot took the arrays
+        if self.shared:
+            self.boulder_x = self.boulder_x.copy()
+            self.boulder_y = self.boulder_y.copy()
+            self.monster_x = self.monster_x.copy()
+            self.monster_y = self.monster_y.copy()
+            self.monster_alive = self.monster_alive.copy()
+            self.shared = False
+        self.changed = True
+        if self.dirty is not None:
+            self.dirty.add(self.name)
+
+    def boulders(self):
+        return zip(self.boulder_x.tolist(), self.boulder_y.tolist())
+
+    def move_boulder(self, i, dx, dy):
+        self.own()
+        self.boulder_x[i] += dx
+        self.boulder_y[i] += dy
+
+    def store_monsters(self, x, y, alive):
+        self.own()
+        self.monster_x[:] = x
+        self.monster_y[:] = y
+        self.monster_alive[:] = alive
+
+
+class RoomSpill:
+    # Evicted rooms that had changed, in a temporary file that goes away
+    # with the process, until they are needed again. A room keeps its slot
+    # in the file after it is restored, and is written back over it the
+    # next time, so going back and forth between rooms does not grow the
+    # file. A record that no longer fits its slot goes at the end, and the
+    # file is rewritten once the slots left behind take up most of it.
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.slots = dict()
+        self.index = set()
+        self.size = 0
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def put(self, room):
+        payload = encode_room(room)
+        slot = self.slots.get(room.name)
+        if slot is None or slot[1] != len(payload):
+            slot = (self.size, len(payload))
+            self.size += len(payload)
+        self.file.seek(slot[0])
+        self.file.write(payload)
+        self.slots[room.name] = slot
+        self.index.add(room.name)
+        live = sum(length for offset, length in self.slots.values())
+        if self.size > max(COMPACT_MIN, COMPACT_RATIO * live):
+            self.compact()
+
+    def restore(self, room, keep=False):
+        offset, length = self.slots[room.name]
+        if not keep:
+            self.index.discard(room.name)
+        self.file.seek(offset)
+        apply_room(room, self.file.read(length))
+
+    def compact(self):
+        fresh = tempfile.TemporaryFile()
+        slots = dict()
+        for name, (offset, length) in sorted(self.slots.items()):
+            self.file.seek(offset)
+            slots[name] = (fresh.tell(), length)
+            fresh.write(self.file.read(length))
+        self.file.close()
+        self.file = fresh
+        self.slots = slots
+        self.size = fresh.tell()
+
+
+class WorldState:
+    # The entities of the rooms around the player, keyed by room name.
+    # Rooms are loaded on first use through loader(name), which returns
+    # their boulders and monsters, and the least recently used ones beyond
+    # resident are evicted; changed rooms go to a RoomSpill on the way out.
+    # Rooms written to since the last take_dirty() are remembered for
+    # whoever saves the world.
+    def __init__(self, loader=None, resident=None):
+        self.loader = loader
+        self.resident = resident
+        self.rooms = OrderedDict()
+        self.pinned = set()
+        self.spill = RoomSpill() if resident else None
+        self.dirty = set()
+
+    def add_room(self, name, mv_boulders=(), monsters=()):
+        self.rooms[name] = RoomState(name, mv_boulders, monsters, self.dirty)
+        return self.rooms[name]
+
+    def room(self, scene_name):
+        name = room_key(scene_name)
+        if name in self.rooms:
+            self.rooms.move_to_end(name)
+            return self.rooms[name]
+        room = self.add_room(name, *self.loader(name))
+        if self.spill is not None and name in self.spill:
+            self.spill.restore(room)
+        self.evict()
+        return room
+
+    def pin(self, scene_names):
+        # The working set: rooms that stay resident whatever their age
+        self.pinned = set(room_key(name) for name in scene_names)
+
+    def evict(self):
+        if not self.resident:
+            return
+        for name in list(self.rooms):
+            if len(self.rooms) <= self.resident:
+                return
+            if name in self.pinned:
+                continue
+            room = self.rooms.pop(name)
+            if room.changed:
+                self.spill.put(room)
+
+    def copy_room(self, name):
+        # A copy to save, whether the room is resident or was evicted
+        if name in self.rooms:
+            return self.rooms[name].copy()
+        room = RoomState(name, *self.loader(name))
+        if name in self.spill:
+            self.spill.restore(room, keep=True)
+        return room
+
+    def snapshot(self):
+        # A frozen copy of the resident rooms in O(rooms), not O(entities)
+        frozen = WorldState()
+        frozen.rooms = OrderedDict(
+            (name, room.copy()) for name, room in self.rooms.items())
+        return frozen
+
+    def take_dirty(self):
+        names = sorted(self.dirty)
+        self.dirty.clear()
+        return names